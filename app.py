@@ -1,9 +1,9 @@
 import logging
-import os
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
 import httpx
-from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from pydantic import BaseModel
 from starlette.middleware.cors import CORSMiddleware
 
@@ -13,12 +13,28 @@ from src.api.dependencies import (
     get_token_manager,
     handle_request_exception,
 )
+from src.api.diagnostics import diagnostics_router
 from src.api.frontend_monitor import frontend_router
+from src.api.jobs import jobs_router
+from src.api.outbox import outbox_router
+from src.clients.https_client import HTTPSClient
 from src.clients.restaurant_client import RestaurantClient
 from src.clients.token_manager import TokenManager
+from src.middleware.deadline_middleware import DeadlineMiddleware
 from src.middleware.timing_middleware import TimingMiddleware
+from src.models.request_models import BatchTableActionsRequest
 from src.order_processor.order_chain import OrderProcessorChain
-from src.services.table_cache import get_table_detail_response, get_tables_response
+from src.services.batch_operations import run_table_actions
+from src.services.checkout import build_table_message, run_checkout
+from src.services.idempotency import run_idempotent
+from src.services.outbox import PosOutbox
+from src.services.table_watcher import TableStatusWatcher
+from src.services.webhooks import WebhookDispatcher
+from src.services.table_cache import (
+    get_table_detail_response,
+    get_table_statuses_response,
+    get_tables_response,
+)
 from src.utils.settings import get_settings
 
 # Configure logging
@@ -28,7 +44,32 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 frontend_origins = list(settings.frontend_allowed_origins or ("http://localhost:3000",))
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the background workers tied to the process lifetime."""
+    token_manager = await get_token_manager()
+    token_manager.start_background_refresh(
+        margin=settings.token_refresh_margin, jitter=settings.token_refresh_jitter
+    )
+    # Replays the POSTQUEUE actions and callbacks still pending from a previous run
+    webhooks = WebhookDispatcher()
+    webhooks.start()
+    outbox = PosOutbox()
+    outbox.start(lambda: get_restaurant_client(token_manager))
+    table_watcher = TableStatusWatcher()
+    table_watcher.start(lambda: get_restaurant_client(token_manager))
+    try:
+        yield
+    finally:
+        await table_watcher.stop()
+        await outbox.stop()
+        await webhooks.stop()
+        await token_manager.stop_background_refresh()
+        await HTTPSClient().aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -40,6 +81,8 @@ app.add_middleware(
 )
 
 app.add_middleware(TimingMiddleware)
+# Outermost: the deadline covers everything below, including the timing wrapper
+app.add_middleware(DeadlineMiddleware)
 
 class BaseResponse(BaseModel):
     response_time: float
@@ -83,39 +126,7 @@ async def create_board_message(
         )
         table_order = payload["table"]
 
-        if not table_order["content"]:
-            raise HTTPException(status_code=404, detail="Table content not found.")
-
-        # Create the file name based on the table_id
-        file_name = f"comanda_{table_id}.txt"
-        file_path = os.path.join(os.getcwd(), file_name)
-
-        processed_table_items = []
-
-        # Format the order
-        formatted_order = ""
-        for item in table_order.get("content", []):
-            product_name = item.get("itemName", "Not found")
-            quantity = item.get("quantity", 1)
-            price = item.get("price", 0.0)
-            total = item.get("total", 0.0)
-            # Format the line
-            line = f"{product_name} - {quantity} X R$ {price:.2f} = R$ {total:.2f}\n"
-            formatted_order += line
-            processed_table_items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": price,
-                    "total": total,
-                }
-            )
-
-        # Process the formatted order
-        print("Formatted order:", formatted_order)
-        order = await order_processor.main(formatted_order, file_path)
-        order["details"]["orders"] = processed_table_items
-        return order
+        return await build_table_message(order_processor, table_id, table_order)
 
     except httpx.HTTPStatusError as groq_error:
         logger.error("Groq API error for table %s: %s", table_id, groq_error)
@@ -148,17 +159,53 @@ async def load_products(
         handle_request_exception(e)
 
 
+# Declared before /tables/{table_id}, which would otherwise capture "status"
+@app.get("/tables/status")
+async def get_table_statuses(
+    ids: str = Query(..., description="Comma-separated table IDs"),
+    version: Optional[int] = Query(default=None, ge=1),
+    if_none_match: Optional[str] = Header(default=None),
+    client: RestaurantClient = Depends(get_restaurant_client),
+):
+    """
+    Return the status of the given tables without downloading the whole list.
+    """
+    try:
+        table_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers.")
+    if not table_ids:
+        raise HTTPException(status_code=400, detail="ids must list at least one table.")
+    try:
+        return await get_table_statuses_response(
+            client, table_ids, version=version, if_none_match=if_none_match
+        )
+    except HTTPException as exc:
+        raise exc
+    except Exception as e:
+        handle_request_exception(e)
+
+
 # /tables/{table_id} was @app.post("/order/")
 @app.get("/tables/{table_id}")
 async def get_table(
-    table_id: int, client: RestaurantClient = Depends(get_restaurant_client)
+    table_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    client: RestaurantClient = Depends(get_restaurant_client),
 ):
     """
     Get details of a specific table by ID (if necessary).
+
+    Answers `304` when `If-None-Match` carries the current ETag.
     """
     try:
         payload = await get_table_detail_response(
-            client, table_id, include_wire_trace=True
+            client,
+            table_id,
+            include_wire_trace=True,
+            response=response,
+            if_none_match=if_none_match,
         )
         return payload["table"]
     except Exception as e:
@@ -169,14 +216,30 @@ async def get_table(
 async def list_tables(
     page: Optional[int] = Query(default=None, ge=1),
     page_size: Optional[int] = Query(default=None, ge=1),
+    version: Optional[int] = Query(default=None, ge=1),
+    status: Optional[List[int]] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: RestaurantClient = Depends(get_restaurant_client),
 ):
     """
     Retrieve a list of tables with optional pagination metadata.
+
+    `status` (repeatable) keeps only tables in those states, e.g. `status=2`
+    for the tables being closed.
+
+    Pass the `version` of the first page to read the following pages from the
+    same snapshot (410 once it has been evicted). Answers `304` when
+    `If-None-Match` carries the current ETag.
     """
     try:
         return await get_tables_response(
-            client, page=page, page_size=page_size, include_wire_trace=False
+            client,
+            page=page,
+            page_size=page_size,
+            include_wire_trace=False,
+            version=version,
+            statuses=status,
+            if_none_match=if_none_match,
         )
     except HTTPException as exc:
         raise exc
@@ -188,22 +251,41 @@ async def list_tables(
 @app.get("/tables/{table_id}/payment/")
 async def set_payment_status(
     table_id: int,
+    response: Response,
     client: RestaurantClient = Depends(get_restaurant_client),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    queued: bool = Query(default=False),
 ):
     """
     Endpoint to set the payment status for a specific table.
 
     Args:
         client (RestaurantClient): The RestaurantClient instance.
+        idempotency_key (str, optional): Repeating a key replays the first result
+            instead of sending another prebill.
+        queued (bool): Record the prebill in the outbox and answer 202 right
+            away; the outbox worker sends it.
 
     Returns:
-        dict: A success message with the server response.
+        dict: A success message with the server response (or the outbox entry).
     """
     table_id = table_id
     try:
+        if queued:
+            entry = await PosOutbox().enqueue("prebill", table_id, idempotency_key)
+            response.status_code = 202
+            return {"status": "Prebill queued", "outbox_entry": entry}
+
         # Send a POSTQUEUE message to set the payment status
-        response = await client.prebill(table_id)
-        return {"status": "Payment status set successfully", "response": response}
+        result, replayed = await run_idempotent(
+            idempotency_key,
+            "prebill",
+            table_id,
+            lambda guid: client.prebill(table_id, guid=guid),
+        )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return {"status": "Payment status set successfully", "response": result}
 
     except HTTPException as http_exc:
         # Re-raise HTTP exceptions to maintain consistent error responses
@@ -219,22 +301,41 @@ async def set_payment_status(
 @app.get("/tables/{table_id}/close/")
 async def close_table_endpoint(
     table_id: int,
+    response: Response,
     client: RestaurantClient = Depends(get_restaurant_client),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    queued: bool = Query(default=False),
 ):
     """
     Endpoint to close a specific table after payment.
 
     Args:
         client (RestaurantClient): The RestaurantClient instance.
+        idempotency_key (str, optional): Repeating a key replays the first result
+            instead of sending another close.
+        queued (bool): Record the close in the outbox and answer 202 right away;
+            the outbox worker sends it.
 
     Returns:
-        dict: A success message with the server response.
+        dict: A success message with the server response (or the outbox entry).
     """
     table_id = table_id
     try:
+        if queued:
+            entry = await PosOutbox().enqueue("close", table_id, idempotency_key)
+            response.status_code = 202
+            return {"status": "Close queued", "outbox_entry": entry}
+
         # Send a POSTQUEUE message to close the table
-        response = await client.close_table(table_id)
-        return {"status": "Table closed successfully", "response": response}
+        result, replayed = await run_idempotent(
+            idempotency_key,
+            "close",
+            table_id,
+            lambda guid: client.close_table(table_id, guid=guid),
+        )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return {"status": "Table closed successfully", "response": result}
 
     except HTTPException as http_exc:
         # Re-raise HTTP exceptions to maintain consistent error responses
@@ -244,7 +345,70 @@ async def close_table_endpoint(
         handle_request_exception(e)
 
 
+@app.get("/tables/{table_id}/checkout/")
+async def checkout_table(
+    table_id: int,
+    client: RestaurantClient = Depends(get_restaurant_client),
+    order_processor: OrderProcessorChain = Depends(get_order_processor_chain),
+):
+    """
+    Endpoint combining the bill message and the prebill in a single call.
+
+    The board is read once; the WhatsApp message and the prebill POSTQUEUE are
+    both produced from that snapshot, and the prebill is only sent once the
+    message was built, so a failed call can be retried safely.
+
+    Returns:
+        dict: The board, the message, the prebill response and per-stage timings.
+    """
+    try:
+        return await run_checkout(client, order_processor, table_id)
+    except HTTPException as http_exc:
+        logger.error(f"HTTP error during checkout for table {table_id}: {http_exc.detail}")
+        raise http_exc
+    except httpx.HTTPStatusError as groq_error:
+        logger.error("Groq API error for table %s: %s", table_id, groq_error)
+        raise HTTPException(
+            status_code=502,
+            detail="Unable to enhance WhatsApp message via Groq at the moment.",
+        ) from groq_error
+    except ValueError as config_error:
+        logger.error("Groq configuration error: %s", config_error)
+        raise HTTPException(
+            status_code=500, detail="Groq configuration error. Please check config.ini."
+        ) from config_error
+    except Exception as e:
+        handle_request_exception(e)
+
+
+@app.post("/tables/batch/")
+async def run_batch_table_actions(
+    request: BatchTableActionsRequest,
+    client: RestaurantClient = Depends(get_restaurant_client),
+):
+    """
+    Endpoint to run several prebill/close actions in one call.
+
+    Actions for the same table run in request order; different tables run
+    concurrently up to `max_concurrency` (or `batch_max_concurrency` from config).
+
+    Returns:
+        dict: Per-action outcomes plus a success/failure summary.
+    """
+    max_concurrency = request.max_concurrency or settings.batch_max_concurrency
+    max_concurrency = min(max_concurrency, settings.batch_max_concurrency)
+    try:
+        return await run_table_actions(
+            client, request.actions, max_concurrency=max_concurrency
+        )
+    except Exception as e:
+        handle_request_exception(e)
+
+
 app.include_router(frontend_router)
+app.include_router(diagnostics_router)
+app.include_router(outbox_router)
+app.include_router(jobs_router)
 
 
 if __name__ == "__main__":
@@ -57,6 +57,7 @@ export type TableSummary = {
   open: number;
   closing: number;
   free: number;
+  inactive: number;
 };
 
 export type PaginationMeta = {
@@ -6,6 +6,7 @@ from fastapi import Depends, HTTPException
 from src.clients.mock_restaurant_client import RestaurantMockClient
 from src.clients.restaurant_client import RestaurantClient
 from src.clients.token_manager import TokenManager
+from src.errors.not_modified_error import NotModifiedError
 from src.order_processor.order_chain import OrderProcessorChain
 from src.utils.settings import get_settings
 
@@ -18,7 +19,11 @@ async def get_token_manager() -> TokenManager:
     app_mode = settings.app_mode
     use_mock = app_mode.lower() == "dev"
     coti_api_url = settings.coti_cloud_services_url
-    token_manager = TokenManager(use_mock=use_mock, url=coti_api_url)
+    token_manager = TokenManager(
+        use_mock=use_mock,
+        url=coti_api_url,
+        credential_cache_ttl=settings.credential_cache_ttl,
+    )
     return token_manager
 
 
@@ -40,6 +45,12 @@ def get_order_processor_chain() -> OrderProcessorChain:
 
 def handle_request_exception(e: Exception):
     """Normalize exception handling for HTTP responses."""
+    if isinstance(e, NotModifiedError):
+        raise e
+    if isinstance(e, HTTPException) and e.status_code in (503, 504):
+        # PoS unavailable / deadline exceeded: keep the status and Retry-After
+        logger.error(f"PoS unavailable: {e.detail}")
+        raise e
     if hasattr(e, "status_code") and e.status_code == 401:
         logger.error(f"Authentication error: {e}")
         raise HTTPException(
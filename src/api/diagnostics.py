@@ -0,0 +1,53 @@
+import logging
+
+from fastapi import APIRouter, HTTPException
+
+from src.clients.adaptive_limiter import AdaptiveConcurrencyLimiter
+from src.clients.circuit_breaker import PosCircuitBreaker
+from src.clients.latency_tracker import PosLatencyTracker
+from src.clients.pos_discovery import PosEndpointResolver
+from src.clients.pos_scheduler import PosScheduler
+from src.clients.table_operations import TableOperationRegistry
+from src.services.table_watcher import TableStatusWatcher
+from src.services.webhooks import WebhookDispatcher
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/diagnostics",
+    tags=["diagnostics"],
+)
+
+
+@router.get("/pos")
+async def get_pos_status():
+    """Report where PoS traffic is sent and the state of the PoS link."""
+    return {
+        "endpoint": PosEndpointResolver().status(),
+        "circuit_breaker": PosCircuitBreaker().status(),
+        "scheduler": PosScheduler().status(),
+        "concurrency": AdaptiveConcurrencyLimiter(PosScheduler()).status(),
+        "latency": PosLatencyTracker().status(),
+        "table_operations": TableOperationRegistry().status(),
+    }
+
+
+@router.post("/pos/discover")
+async def discover_pos():
+    """Look for the XD server now instead of waiting for connect failures."""
+    endpoint = await PosEndpointResolver().discover()
+    if endpoint is None:
+        raise HTTPException(status_code=503, detail="No XD server found.")
+    return {"endpoint": PosEndpointResolver().status()}
+
+
+@router.get("/webhooks")
+async def get_webhooks_status():
+    """Report the webhook delivery queue and the table status watcher."""
+    return {
+        "dispatcher": await WebhookDispatcher().status(),
+        "table_watcher": TableStatusWatcher().status(),
+    }
+
+
+diagnostics_router = router
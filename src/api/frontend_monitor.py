@@ -1,10 +1,11 @@
 import logging
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 
 from src.api.dependencies import get_restaurant_client, handle_request_exception
 from src.clients.restaurant_client import RestaurantClient
+from src.errors.not_modified_error import NotModifiedError
 from src.services.table_cache import (
     get_table_detail_response,
     get_tables_response,
@@ -23,12 +24,21 @@ router = APIRouter(
 async def list_tables(
     page: Optional[int] = Query(default=None, ge=1),
     page_size: Optional[int] = Query(default=None, ge=1),
+    version: Optional[int] = Query(default=None, ge=1),
+    status: Optional[List[int]] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: RestaurantClient = Depends(get_restaurant_client),
 ):
     """List tables (optionally paginated) along with the TCP wire trace."""
     try:
         payload = await get_tables_response(
-            client, page=page, page_size=page_size, include_wire_trace=True
+            client,
+            page=page,
+            page_size=page_size,
+            include_wire_trace=True,
+            version=version,
+            statuses=status,
+            if_none_match=if_none_match,
         )
         return payload
     except HTTPException as exc:
@@ -40,14 +50,23 @@ async def list_tables(
 
 @router.get("/tables/{table_id}")
 async def get_table(
-    table_id: int, client: RestaurantClient = Depends(get_restaurant_client)
+    table_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    client: RestaurantClient = Depends(get_restaurant_client),
 ):
     """Fetch a specific table with its content and trace metadata."""
     try:
         payload = await get_table_detail_response(
-            client, table_id, include_wire_trace=True
+            client,
+            table_id,
+            include_wire_trace=True,
+            response=response,
+            if_none_match=if_none_match,
         )
         return payload
+    except NotModifiedError:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch table {table_id}: {e}")
         handle_request_exception(e)
@@ -0,0 +1,73 @@
+import logging
+from typing import Optional
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Header, HTTPException, Response
+
+from src.models.request_models import JobRequest
+from src.services.outbox import PosOutbox, job_view
+from src.services.webhooks import WebhookDispatcher
+from src.utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+)
+
+
+def _check_callback_url(callback_url: str):
+    """
+    Only accept callbacks to `job_callback_hosts` (by default, the hosts of
+    `table_events_webhook_urls`), so jobs cannot target internal services.
+    """
+    settings = get_settings()
+    allowed = set(settings.job_callback_hosts) or {
+        urlsplit(url).hostname for url in settings.table_events_webhook_urls
+    }
+    host = urlsplit(callback_url).hostname
+    if host is None or host.lower() not in allowed:
+        logger.warning(f"Rejected job callback to host {host!r}.")
+        raise HTTPException(status_code=422, detail="callback_url host is not allowed.")
+
+
+@router.post("", status_code=202)
+async def create_job(
+    request: JobRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
+    """
+    Queue a prebill/close and return its job ID at once.
+
+    The action is stored in the outbox before answering; poll `status_url` or
+    pass `callback_url` (on an allowed host) to receive a `job.done` /
+    `job.failed` event.
+    """
+    callback_url = str(request.callback_url) if request.callback_url else None
+    if callback_url is not None:
+        _check_callback_url(callback_url)
+    entry = await PosOutbox().enqueue(
+        request.action, request.table_id, idempotency_key, callback_url=callback_url
+    )
+    status_url = f"/jobs/{entry['id']}"
+    response.headers["Location"] = status_url
+    return {**job_view(entry), "status_url": status_url}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int):
+    """Return a job's state, its PoS result once done and its callback delivery."""
+    entry = await PosOutbox().get(job_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    payload = job_view(entry)
+    if entry["callback_url"]:
+        payload["callback"] = await WebhookDispatcher().delivery_status(
+            f"job:{job_id}"
+        ) or {"url": entry["callback_url"], "status": "waiting"}
+    return payload
+
+
+jobs_router = router
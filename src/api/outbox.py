@@ -0,0 +1,38 @@
+import logging
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from src.services.outbox import PosOutbox
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/outbox",
+    tags=["outbox"],
+)
+
+
+@router.get("")
+async def list_outbox(
+    status: Optional[Literal["pending", "done", "failed"]] = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """Inspect the queued prebill/close actions (most recent first) and the backlog."""
+    outbox = PosOutbox()
+    return {
+        "backlog": await outbox.status(),
+        "entries": await outbox.list_entries(status=status, limit=limit),
+    }
+
+
+@router.get("/{entry_id}")
+async def get_outbox_entry(entry_id: int):
+    """Return a single outbox entry, including its PoS result once acknowledged."""
+    entry = await PosOutbox().get(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Outbox entry not found.")
+    return entry
+
+
+outbox_router = router
@@ -0,0 +1,140 @@
+import logging
+import time
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from ..utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Find the concurrency the site's XD server sustains (AIMD).
+
+    Every finished PoS exchange is a sample. While latency stays close to the
+    best latency seen for that message kind (opcode plus object type, as keyed
+    by PosLatencyTracker), the limit grows by one per "window" of successful
+    calls (additive increase). A transport failure, or a latency above
+    LATENCY_TOLERANCE times the kind's baseline, cuts the limit by
+    DECREASE_FACTOR (multiplicative decrease), at most once per cool-down so a
+    single burst is not punished twice. The resulting limit is pushed to the
+    PosScheduler.
+    """
+
+    EWMA_ALPHA: float = 0.2
+    BASELINE_DRIFT: float = 0.01  # Lets the baseline follow a slower server
+    LATENCY_TOLERANCE: float = 2.0
+    DECREASE_FACTOR: float = 0.7
+    DECREASE_COOLDOWN: float = 1.0  # Seconds between two decreases
+    WARMUP_SAMPLES: int = 5  # Samples per kind before latency can trigger a decrease
+
+    _instance: Optional["AdaptiveConcurrencyLimiter"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(AdaptiveConcurrencyLimiter, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, scheduler):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.enabled: bool = settings.pos_adaptive_concurrency
+            self.min_limit: int = settings.pos_concurrency_min
+            self.max_limit: int = max(settings.pos_concurrency_max, self.min_limit)
+            self.scheduler = scheduler
+            self.limit: float = float(
+                min(self.max_limit, max(self.min_limit, scheduler.limit))
+            )
+            self._last_decrease_at: Optional[float] = None
+            self.increases = 0
+            self.decreases = 0
+            self.kinds: Dict[str, Dict[str, Any]] = {}
+            if self.enabled:
+                self._apply()
+            self._initialized = True  # Prevent re-initialization
+
+    def _stats(self, kind: str) -> Dict[str, Any]:
+        return self.kinds.setdefault(
+            kind,
+            {
+                "samples": 0,
+                "errors": 0,
+                "latency_ewma": None,
+                "latency_baseline": None,
+                "error_rate": 0.0,
+            },
+        )
+
+    def record_success(self, kind: str, latency: float):
+        """Feed a completed exchange (called while its scheduler slot is held)."""
+        stats = self._stats(kind)
+        stats["samples"] += 1
+        stats["error_rate"] *= 1 - self.EWMA_ALPHA
+        ewma = stats["latency_ewma"]
+        stats["latency_ewma"] = (
+            latency if ewma is None else ewma + self.EWMA_ALPHA * (latency - ewma)
+        )
+        baseline = stats["latency_baseline"]
+        if baseline is None or latency < baseline:
+            stats["latency_baseline"] = latency
+        else:
+            stats["latency_baseline"] = baseline + self.BASELINE_DRIFT * (latency - baseline)
+
+        if not self.enabled:
+            return
+        baseline = stats["latency_baseline"]
+        if (
+            stats["samples"] > self.WARMUP_SAMPLES
+            and baseline
+            and latency > self.LATENCY_TOLERANCE * baseline
+        ):
+            self._decrease(f"{kind} latency {latency:.2f}s over baseline {baseline:.2f}s")
+        elif self.scheduler.in_flight >= self.limit / 2:
+            # Only grow when the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+            self._apply()
+
+    def record_failure(self, kind: str):
+        """Feed a transport failure (timeout, refused, dropped connection)."""
+        stats = self._stats(kind)
+        stats["samples"] += 1
+        stats["errors"] += 1
+        stats["error_rate"] += self.EWMA_ALPHA * (1 - stats["error_rate"])
+        if self.enabled:
+            self._decrease(f"{kind} transport failure")
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if (
+            self._last_decrease_at is not None
+            and now - self._last_decrease_at < self.DECREASE_COOLDOWN
+        ):
+            return
+        self._last_decrease_at = now
+        previous = int(self.limit)
+        self.limit = max(float(self.min_limit), self.limit * self.DECREASE_FACTOR)
+        self.decreases += 1
+        if int(self.limit) != previous:
+            logger.warning(f"PoS concurrency limit {previous} -> {int(self.limit)} ({reason})")
+        self._apply()
+
+    def _apply(self):
+        if int(self.limit) != self.scheduler.limit:
+            self.scheduler.set_limit(int(self.limit))
+
+    def status(self) -> Dict[str, Any]:
+        """Current limit and per-kind latency/error figures, for diagnostics."""
+        return {
+            "enabled": self.enabled,
+            "limit": int(self.limit),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "kinds": self.kinds,
+        }
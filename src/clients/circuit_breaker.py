@@ -0,0 +1,129 @@
+import logging
+import time
+from collections import deque
+from threading import Lock
+from typing import Any, Deque, Dict, Optional
+
+from ..errors.pos_unavailable_error import PosUnavailableError
+from ..utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class PosCircuitBreaker:
+    """
+    Circuit breaker around the PoS transport.
+
+    - closed: calls go through; outcomes are kept in a sliding window and the
+      circuit opens once the failure rate reaches the threshold.
+    - open: calls fail immediately with a 503 until the cool-down elapses.
+    - half-open: a limited number of probe calls go through; a success closes
+      the circuit, a failure opens it again.
+
+    Only transport outcomes are recorded; PoS authentication errors count as
+    successful exchanges.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    WINDOW_SIZE: int = 20
+    HALF_OPEN_MAX_CALLS: int = 1
+
+    _instance: Optional["PosCircuitBreaker"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(PosCircuitBreaker, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.failure_rate_threshold: float = settings.pos_breaker_failure_rate
+            self.minimum_calls: int = settings.pos_breaker_minimum_calls
+            self.open_seconds: float = settings.pos_breaker_open_seconds
+            self.state = self.CLOSED
+            self._outcomes: Deque[bool] = deque(maxlen=self.WINDOW_SIZE)
+            self._opened_at: Optional[float] = None
+            self._half_open_calls = 0
+            self.last_failure: Optional[str] = None
+            self._initialized = True  # Prevent re-initialization
+
+    def _retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def before_call(self):
+        """Fail fast while open; let a limited number of probes through half-open."""
+        if self.state == self.OPEN:
+            if self._retry_after() > 0:
+                raise PosUnavailableError(
+                    "PoS unavailable (circuit open), try again later.",
+                    retry_after=self._retry_after(),
+                    transient=False,
+                )
+            self._transition(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self._half_open_calls >= self.HALF_OPEN_MAX_CALLS:
+                raise PosUnavailableError(
+                    "PoS unavailable (recovery probe in progress), try again later.",
+                    retry_after=1,
+                    transient=False,
+                )
+            self._half_open_calls += 1
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self._transition(self.CLOSED)
+            return
+        self._outcomes.append(True)
+
+    def record_failure(self, reason: str):
+        self.last_failure = reason
+        if self.state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+            return
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if (
+            len(self._outcomes) >= self.minimum_calls
+            and failures / len(self._outcomes) >= self.failure_rate_threshold
+        ):
+            self._transition(self.OPEN)
+
+    def release(self):
+        """
+        Give back a call slot without a verdict (deadline expired or caller
+        cancelled), so a half-open probe that never finished does not keep the
+        circuit stuck.
+        """
+        if self.state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _transition(self, state: str):
+        logger.warning(f"PoS circuit {self.state} -> {state}")
+        self.state = state
+        self._half_open_calls = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self._opened_at = None
+            self._outcomes.clear()
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the breaker for diagnostics."""
+        failures = self._outcomes.count(False)
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+            "retry_after": self._retry_after() if self.state == self.OPEN else 0.0,
+            "last_failure": self.last_failure,
+        }
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialStore:
+    """
+    Persist the matched XD credentials and how each one performed.
+
+    The last credential that produced a DeviceConfiguration is tried first on
+    the next authentication, and the matched-credential list is reused while it
+    is younger than the configured TTL, skipping the cloud round-trips.
+    """
+
+    _instance: Optional["CredentialStore"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(CredentialStore, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, state_file: str = "credential_store_state.json"):
+        if not hasattr(self, "_initialized"):
+            self._state_file = state_file  # Lives next to token_manager_state.json
+            self.last_good_credential_id: Optional[str] = None
+            self.matched_credentials: List[Dict[str, Any]] = []
+            self.matched_at: Optional[float] = None
+            self.history: Dict[str, Dict[str, Any]] = {}
+            self._load_from_file()
+            self._initialized = True  # Prevent re-initialization
+
+    def _load_from_file(self):
+        """Load the persisted state, starting empty if it is missing or corrupt."""
+        if not os.path.exists(self._state_file):
+            return
+        try:
+            with open(self._state_file, "r") as f:
+                data = json.load(f)
+            self.last_good_credential_id = data.get("last_good_credential_id")
+            self.matched_credentials = data.get("matched_credentials") or []
+            self.matched_at = data.get("matched_at")
+            self.history = data.get("history") or {}
+            logger.info("Credential state loaded from file.")
+        except Exception as e:
+            logger.error(f"Failed to load credential state: {e}")
+
+    def _save_to_file(self):
+        """Write the state atomically so a crash never leaves a partial file."""
+        tmp_file = f"{self._state_file}.tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(
+                    {
+                        "last_good_credential_id": self.last_good_credential_id,
+                        "matched_credentials": self.matched_credentials,
+                        "matched_at": self.matched_at,
+                        "history": self.history,
+                    },
+                    f,
+                )
+            os.replace(tmp_file, self._state_file)
+        except Exception as e:
+            logger.error(f"Failed to save credential state: {e}")
+
+    def get_cached_credentials(self, ttl: float) -> Optional[List[Dict[str, Any]]]:
+        """Return the matched credentials if they were fetched within `ttl` seconds."""
+        if not self.matched_credentials or not self.matched_at or ttl <= 0:
+            return None
+        if time.time() - self.matched_at > ttl:
+            return None
+        return self.matched_credentials
+
+    def store_matched_credentials(self, credentials: List[Dict[str, Any]]):
+        """Cache a fresh `/myxdcredentials/match` result."""
+        self.matched_credentials = list(credentials)
+        self.matched_at = time.time()
+        self._save_to_file()
+
+    def clear_matched_credentials(self):
+        """Drop the cached list so the next authentication asks the cloud again."""
+        self.matched_credentials = []
+        self.matched_at = None
+        self._save_to_file()
+
+    def _entry(self, credential_id: str) -> Dict[str, Any]:
+        return self.history.setdefault(
+            str(credential_id),
+            {
+                "successes": 0,
+                "failures": 0,
+                "last_latency": None,
+                "last_success_at": None,
+                "last_failure_at": None,
+            },
+        )
+
+    def record_success(self, credential_id: str, latency: float):
+        """Mark a credential as the last known good one."""
+        entry = self._entry(credential_id)
+        entry["successes"] += 1
+        entry["last_latency"] = latency
+        entry["last_success_at"] = time.time()
+        self.last_good_credential_id = str(credential_id)
+        self._save_to_file()
+
+    def record_failures(self, credential_ids: List[str]):
+        """Count a failed probe for each credential."""
+        now = time.time()
+        for credential_id in credential_ids:
+            entry = self._entry(credential_id)
+            entry["failures"] += 1
+            entry["last_failure_at"] = now
+            if self.last_good_credential_id == str(credential_id):
+                self.last_good_credential_id = None
+        self._save_to_file()
+
+    def rank_key(self, credential: Dict[str, Any]):
+        """
+        Sort key placing the last known good credential first, then credentials
+        that succeeded more recently than they failed, then the never-tried ones;
+        credentials whose latest probe failed go last.
+        """
+        credential_id = str(credential.get("credentialId"))
+        if credential_id == self.last_good_credential_id:
+            return (0, 0.0)
+        entry = self.history.get(credential_id)
+        if entry is None:
+            return (2, 0.0)
+        last_success_at = entry.get("last_success_at") or 0.0
+        last_failure_at = entry.get("last_failure_at") or 0.0
+        if last_success_at >= last_failure_at and last_success_at:
+            return (1, -last_success_at)
+        if not last_failure_at:
+            return (2, 0.0)
+        return (3, last_failure_at)
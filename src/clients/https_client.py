@@ -1,16 +1,72 @@
-import requests
+import asyncio
 import base64
 import socket
 import json
 import uuid
 import random
 import time
+import weakref
 from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import httpx
+
+from .pos_discovery import PosEndpointResolver
+
+try:  # HTTP/2 needs the optional `h2` package
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HTTP2_AVAILABLE = False
+
+
+class _DeviceAuthProtocol(asyncio.DatagramProtocol):
+    """Resolve a future with the DeviceConfiguration answering one device ID."""
+
+    def __init__(self, device_id, reply):
+        self.device_id = device_id
+        self.reply = reply
+
+    def datagram_received(self, data, addr):
+        if self.reply.done():
+            return
+        try:
+            device_configuration = json.loads(
+                data.decode("utf-8").replace("[EOM]", "")
+            )
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return
+        if not isinstance(device_configuration, dict):
+            return
+        # Ignore replies addressed to another probe when the server echoes the ID
+        reply_device_id = device_configuration.get(
+            "DeviceId", device_configuration.get("deviceId")
+        )
+        if reply_device_id and reply_device_id != self.device_id:
+            return
+        self.reply.set_result(device_configuration)
+
+    def error_received(self, exc):
+        # ICMP errors (e.g. port unreachable) just leave the probe to time out
+        pass
 
 
 class HTTPSClient:
     _instance = None  # Class-level variable to hold the singleton instance
 
+    # Cloud HTTP tuning
+    CONNECT_TIMEOUT: float = 5.0
+    READ_TIMEOUT: float = 15.0
+    MAX_RETRIES: int = 3
+    RETRY_BACKOFF: float = 0.5  # Seconds, doubled after each failed attempt
+    MAX_CONNECTIONS: int = 4
+
+    # UDP device-auth probing
+    PROBE_TIMEOUT: float = 3.0  # Wait for a single credential's reply
+    PROBE_DEADLINE: float = 6.0  # Global deadline for one probing round
+    PROBE_CONCURRENCY: int = 8
+
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(HTTPSClient, cls).__new__(cls)
@@ -22,6 +78,10 @@ class HTTPSClient:
             self.auth_url = f"{self.base_url}/oauth/token"
             self.access_token = None
             self.port = 8978
+            # One pool per event loop: the lifespan loop and the short-lived
+            # loops of asyncio.run() (e.g. RestaurantClient start-up) must not
+            # share connections bound to another loop
+            self._http_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
             # Variables to store selected credential details
             self.selected_credential_id = None
@@ -34,7 +94,47 @@ class HTTPSClient:
 
             self._initialized = True  # Flag to prevent re-initialization
 
-    def authenticate(self, username, password, client_id, client_secret):
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the running loop's keep-alive client, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._http_clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._http_clients[loop] = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(self.READ_TIMEOUT, connect=self.CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.MAX_CONNECTIONS,
+                    max_keepalive_connections=self.MAX_CONNECTIONS,
+                ),
+            )
+        return client
+
+    async def aclose(self):
+        """Close the running loop's pooled connections."""
+        client = self._http_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def _post(self, url, **kwargs) -> httpx.Response:
+        """POST with retries on transport errors and 5xx responses."""
+        client = self._get_http_client()
+        delay = self.RETRY_BACKOFF
+        for attempt in range(1, self.MAX_RETRIES + 1):
+            try:
+                response = await client.post(url, **kwargs)
+                if response.status_code < 500 or attempt == self.MAX_RETRIES:
+                    return response
+                print(
+                    f"[Client] {url} returned {response.status_code} (attempt {attempt}/{self.MAX_RETRIES})"
+                )
+            except httpx.TransportError as e:
+                if attempt == self.MAX_RETRIES:
+                    raise
+                print(f"[Client] {url} failed: {e!r} (attempt {attempt}/{self.MAX_RETRIES})")
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay *= 2
+
+    async def authenticate(self, username, password, client_id, client_secret):
         """Send the OAuth authentication request and receive the access token."""
 
         client_credentials = f"{client_id}:{client_secret}"
@@ -55,7 +155,7 @@ class HTTPSClient:
         }
 
         try:
-            response = requests.post(self.auth_url, headers=headers, data=auth_data)
+            response = await self._post(self.auth_url, headers=headers, data=auth_data)
 
             if response.status_code == 200:
                 token = response.json().get("access_token")
@@ -71,12 +171,12 @@ class HTTPSClient:
                     f"[Client] Authentication failed with status code {response.status_code}"
                 )
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"[Client] An error occurred: {e}")
 
         return False
 
-    def match_credentials(self, username, password):
+    async def match_credentials(self, username, password):
         """Send a request to match credentials."""
         if not self.access_token:
             print("[Client] Error: You must authenticate first.")
@@ -95,7 +195,7 @@ class HTTPSClient:
         }
 
         try:
-            response = requests.post(url, json=match_data, headers=headers)
+            response = await self._post(url, json=match_data, headers=headers)
 
             if response.status_code == 200:
                 credentials = response.json()
@@ -106,7 +206,7 @@ class HTTPSClient:
                     f"[Client] Failed to match credentials with status code {response.status_code}"
                 )
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"[Client] An error occurred during credential matching: {e}")
             return None
 
@@ -151,6 +251,28 @@ class HTTPSClient:
         print("[Client] No active credentials found.")
         return False
 
+    @staticmethod
+    def _pos_endpoint():
+        """Return the XD server (host, port) known to the endpoint resolver."""
+        return PosEndpointResolver().current()
+
+    @staticmethod
+    def _build_device_auth_message(authorization, device_id) -> bytes:
+        """Encode a DeviceAuthenticationRequest followed by the [EOM] marker."""
+        alias = "Coti"  # Fixed alias
+
+        # Prepare the DeviceAuthenticationRequest
+        device_auth_request = {
+            "applicationId": 1,  # Example app ID, replace with actual
+            "authorizationCode": authorization,
+            "deviceId": device_id,
+            "alias": alias,
+        }
+
+        # Convert the request to JSON and append the [EOM] marker
+        message = json.dumps(device_auth_request) + "[EOM]"
+        return message.encode("utf-8")
+
     def request_device_configuration(self):
         """Request device configuration over UDP using selected credentials."""
         if not self.selected_authorization:
@@ -161,19 +283,9 @@ class HTTPSClient:
         try:
             # Generate a random device ID (UUID)
             device_id = str(uuid.uuid4())
-            alias = "Coti"  # Fixed alias
-
-            # Prepare the DeviceAuthenticationRequest
-            device_auth_request = {
-                "applicationId": 1,  # Example app ID, replace with actual
-                "authorizationCode": self.selected_authorization,
-                "deviceId": device_id,
-                "alias": alias,
-            }
-
-            # Convert the request to JSON and append the [EOM] marker
-            message = json.dumps(device_auth_request) + "[EOM]"
-            message_bytes = message.encode("utf-8")
+            message_bytes = self._build_device_auth_message(
+                self.selected_authorization, device_id
+            )
 
             # Send the message over UDP
             udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -185,7 +297,7 @@ class HTTPSClient:
 
             print("[Client] Sending device auth request...")
             # Send the device auth request to the broadcast address (255.255.255.255) on port 8978
-            udp_socket.sendto(message_bytes, ("192.168.15.100", self.port))
+            udp_socket.sendto(message_bytes, self._pos_endpoint())
             print("[Client] Device auth request sent.")
             # Receive the response
             start_time = time.time()
@@ -215,6 +327,81 @@ class HTTPSClient:
 
         return None
 
+    async def _probe_credential(self, credential, deadline):
+        """Send one device-auth request and wait for its reply until `deadline`."""
+        loop = asyncio.get_running_loop()
+        device_id = str(uuid.uuid4())
+        reply = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DeviceAuthProtocol(device_id, reply),
+            family=socket.AF_INET,
+            allow_broadcast=True,
+        )
+        try:
+            transport.sendto(
+                self._build_device_auth_message(credential.get("authorization"), device_id),
+                self._pos_endpoint(),
+            )
+            remaining = max(0.0, min(self.PROBE_TIMEOUT, deadline - loop.time()))
+            return await asyncio.wait_for(reply, timeout=remaining)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            transport.close()
+
+    async def probe_credentials(self, credentials, deadline=None, key=None):
+        """
+        Probe the usable credentials concurrently and return the first valid
+        DeviceConfiguration.
+
+        Each probe uses its own UDP socket and device ID and waits at most
+        PROBE_TIMEOUT, up to PROBE_CONCURRENCY at a time, all bounded by one
+        global deadline (`deadline` seconds, PROBE_DEADLINE by default), so a
+        round costs about one timeout instead of one timeout per credential.
+        An optional sort `key` reorders the usable credentials (newest first by
+        default) to decide which ones are probed first.
+        """
+        ordered_credentials = self.usable_credentials(credentials)
+        if key is not None:
+            ordered_credentials.sort(key=key)
+        if not ordered_credentials:
+            print("[Client] No usable credentials to probe.")
+            return None
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (deadline or self.PROBE_DEADLINE)
+        semaphore = asyncio.Semaphore(self.PROBE_CONCURRENCY)
+
+        async def probe(credential):
+            async with semaphore:
+                if loop.time() >= deadline:
+                    return credential, None
+                try:
+                    return credential, await self._probe_credential(credential, deadline)
+                except OSError as e:
+                    print(
+                        f"[Client] Probe failed for credential {credential.get('credentialId')}: {e}"
+                    )
+                    return credential, None
+
+        print(f"[Client] Probing {len(ordered_credentials)} credentials concurrently...")
+        tasks = [asyncio.ensure_future(probe(cred)) for cred in ordered_credentials]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                credential, device_config = await next_result
+                if device_config and device_config.get("Token"):
+                    self._store_selected_credential(credential)
+                    print(
+                        f"[Client] Credential {self.selected_credential_id} returned a device configuration."
+                    )
+                    return device_config
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        print("[Client] No credentials succeeded in requesting device configuration.")
+        return None
+
     def select_random_credential(self, credentials):
         """Randomly select a credential from the list."""
         if not credentials:
@@ -267,10 +454,19 @@ class HTTPSClient:
         print(f"[Client] No credential found with ID {credential_id}.")
         return False
 
-    from datetime import datetime, timedelta, timezone
+    def _store_selected_credential(self, credential):
+        """Store the selected credential details in class variables."""
+        self.selected_credential_id = credential.get("credentialId")
+        self.selected_username = credential.get("username")
+        self.selected_terminal = credential.get("terminal")
+        self.selected_authorization = credential.get("authorization")
+        self.selected_expiration_date = credential.get("expirationDate")
+        self.selected_active = credential.get("active")
+        self.selected_type = credential.get("type")
 
-    def try_all_credentials_until_success(self, credentials):
-        """Try each credential, starting with the newest, until one returns a successful device configuration."""
+    @staticmethod
+    def usable_credentials(credentials):
+        """Drop expired credentials and sort the rest from newest to oldest."""
 
         # Get current UTC time as a timezone-aware datetime (current day, now)
         current_time = datetime.now(timezone.utc)
@@ -290,19 +486,20 @@ class HTTPSClient:
         sorted_credentials.sort(
             key=lambda cred: cred.get("expirationDate", 0), reverse=True
         )
+        return sorted_credentials
+
+    def try_all_credentials_until_success(self, credentials):
+        """Try each credential, starting with the newest, until one returns a successful device configuration."""
+
+        # Get current UTC time as a timezone-aware datetime (current day, now)
+        current_time = datetime.now(timezone.utc)
+        sorted_credentials = self.usable_credentials(credentials)
 
         print(f"Credentials after filtering for expiration after {current_time}:")
 
         try:
             for credential in sorted_credentials:
-                # Store the selected credential details in class variables
-                self.selected_credential_id = credential.get("credentialId")
-                self.selected_username = credential.get("username")
-                self.selected_terminal = credential.get("terminal")
-                self.selected_authorization = credential.get("authorization")
-                self.selected_expiration_date = credential.get("expirationDate")
-                self.selected_active = credential.get("active")
-                self.selected_type = credential.get("type")
+                self._store_selected_credential(credential)
 
                 print(f"\n[Client] Credential {self.selected_credential_id} selected:")
                 print(f"  Username         : {self.selected_username}")
@@ -371,7 +568,7 @@ class HTTPSClient:
         print("[Client] No credentials found with valid expiration dates.")
         return False
 
-    def add_credentials(self):
+    async def add_credentials(self):
         """Generate new credentials and send a POST request to add them to the server."""
         if not self.access_token:
             print("[Client] Error: You must authenticate first.")
@@ -407,7 +604,7 @@ class HTTPSClient:
                 "type": type,
             }
 
-            response = requests.post(url, headers=headers, json=credentials_data)
+            response = await self._post(url, headers=headers, json=credentials_data)
 
             print("Response:", response.json())
 
@@ -426,12 +623,12 @@ class HTTPSClient:
                     f"[Client] Failed to add credentials with status code {response.status_code}"
                 )
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"[Client] An error occurred during credential addition: {e}")
             return None
 
 
-def handle_authentication_and_request(
+async def handle_authentication_and_request(
     username,
     password,
     client_id,
@@ -456,7 +653,7 @@ def handle_authentication_and_request(
     client = HTTPSClient()
 
     # Step 1: Authenticate
-    success = client.authenticate(username, password, client_id, client_secret)
+    success = await client.authenticate(username, password, client_id, client_secret)
     if not success:
         print("Authentication failed.")
         return False
@@ -464,7 +661,7 @@ def handle_authentication_and_request(
     print("Authentication successful!")
 
     # Step 2: Match credentials
-    matched_credentials = client.match_credentials(username_app, password_app)
+    matched_credentials = await client.match_credentials(username_app, password_app)
     if not matched_credentials:
         print("Failed to match credentials.")
         return False
@@ -496,15 +693,17 @@ if __name__ == "__main__":
     client_id = "mobileapps"
     client_secret = ""  # If a client secret is required, add it here.
 
-    handle_authentication_and_request(
-        username, password, client_id, client_secret, username_app, password_app
+    asyncio.run(
+        handle_authentication_and_request(
+            username, password, client_id, client_secret, username_app, password_app
+        )
     )
     # Step 1: Authenticate
-    # success = client.authenticate(username, password, client_id, client_secret)
+    # success = asyncio.run(client.authenticate(username, password, client_id, client_secret))
     # if success:
     #     print("Authentication successful!")
 
     #     # Step 2: Add new credentials
-    #     client.add_credentials()
+    #     asyncio.run(client.add_credentials())
     # else:
     #     print("Authentication failed.")
@@ -0,0 +1,126 @@
+import logging
+import re
+from collections import deque
+from threading import Lock
+from typing import Any, Deque, Dict, Optional
+
+from ..utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+_OBJECT_TYPE_PATTERN = re.compile(r"\[NP\]OBJECTTYPE\[EQ\]([^\[]+)")
+_LIMIT_PATTERN = re.compile(r"\[NP\]LIMIT\[EQ\](\d+)")
+
+# Writes: a timeout leaves their outcome unknown, so they never get less
+# than the configured read timeout
+_WRITE_OPCODES = frozenset({"POSTQUEUE"})
+
+
+class PosLatencyTracker:
+    """
+    Learn how long each kind of PoS message takes and size read timeouts on it.
+
+    Latencies are kept per message kind (the opcode, plus the object type for
+    GETDATALIST). Once enough samples exist, the read timeout is the rolling
+    PERCENTILE latency times HEADROOM; before that, the configured
+    pos_read_timeout is used. List fetches also get a size budget from the row
+    count seen last time (or the requested LIMIT), so a 5000-row catalog is not
+    cut off at a board read's timeout. Every timeout is clamped to
+    pos_read_timeout_min..pos_read_timeout_max; writes (POSTQUEUE) are never
+    given less than pos_read_timeout, however fast they usually answer.
+    """
+
+    SAMPLES: int = 100  # Rolling window per message kind
+    MIN_SAMPLES: int = 10  # Samples needed before the learned timeout is used
+    PERCENTILE: float = 0.99
+    HEADROOM: float = 2.0
+
+    _instance: Optional["PosLatencyTracker"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(PosLatencyTracker, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.default_timeout: float = settings.pos_read_timeout
+            self.min_timeout: float = settings.pos_read_timeout_min
+            self.max_timeout: float = max(settings.pos_read_timeout_max, self.min_timeout)
+            self.seconds_per_1000_rows: float = settings.pos_list_seconds_per_1000_rows
+            self._samples: Dict[str, Deque[float]] = {}
+            self._rows: Dict[str, int] = {}
+            self._timeouts: Dict[str, int] = {}
+            self._initialized = True  # Prevent re-initialization
+
+    @staticmethod
+    def key_for(message: str) -> str:
+        """Message kind: the opcode, plus the object type for GETDATALIST."""
+        opcode = message.split("[", 1)[0]
+        match = _OBJECT_TYPE_PATTERN.search(message)
+        return f"{opcode}:{match.group(1)}" if match else opcode
+
+    def read_timeout(self, message: str) -> float:
+        """Read timeout for `message`, from its kind's history and size."""
+        key = self.key_for(message)
+        samples = self._samples.get(key)
+        if samples is not None and len(samples) >= self.MIN_SAMPLES:
+            timeout = self._percentile(samples) * self.HEADROOM
+        else:
+            timeout = self.default_timeout
+
+        limit = _LIMIT_PATTERN.search(message)
+        if limit is not None:
+            rows = min(int(limit.group(1)), self._rows.get(key, int(limit.group(1))))
+            timeout = max(
+                timeout, self.min_timeout + rows / 1000 * self.seconds_per_1000_rows
+            )
+        floor = self.min_timeout
+        if key.split(":", 1)[0] in _WRITE_OPCODES:
+            floor = max(floor, self.default_timeout)
+        return min(self.max_timeout, max(floor, timeout))
+
+    def record(self, message: str, latency: float):
+        """Add the latency of a completed exchange."""
+        key = self.key_for(message)
+        self._samples.setdefault(key, deque(maxlen=self.SAMPLES)).append(latency)
+
+    def record_timeout(self, message: str, timeout: float):
+        """
+        Count a read timeout. The budget is kept as a (lower-bound) sample so
+        repeated timeouts raise the learned timeout instead of recurring.
+        """
+        key = self.key_for(message)
+        self._timeouts[key] = self._timeouts.get(key, 0) + 1
+        self._samples.setdefault(key, deque(maxlen=self.SAMPLES)).append(timeout)
+
+    def record_rows(self, message: str, rows: int):
+        """Remember how many rows a list fetch returned, for its next budget."""
+        self._rows[self.key_for(message)] = rows
+
+    def _percentile(self, samples: Deque[float]) -> float:
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.PERCENTILE * len(ordered)))]
+
+    def status(self) -> Dict[str, Any]:
+        """Per-kind latency percentiles, row counts and timeouts, for diagnostics."""
+        kinds = {}
+        for key, samples in self._samples.items():
+            ordered = sorted(samples)
+            kinds[key] = {
+                "samples": len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p99": self._percentile(samples),
+                "rows": self._rows.get(key),
+                "timeouts": self._timeouts.get(key, 0),
+            }
+        return {
+            "default_timeout": self.default_timeout,
+            "min_timeout": self.min_timeout,
+            "max_timeout": self.max_timeout,
+            "kinds": kinds,
+        }
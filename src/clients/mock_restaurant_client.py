@@ -8,6 +8,11 @@ from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from faker import Faker
 from ..models.entity_models import Product, Table
+from ..models.product_catalog import ProductCatalog
+from ..services.table_cache import get_fresh_table_content, store_table_content
+from ..utils.deadline import within_deadline
+from ..utils.settings import get_settings
+from .table_operations import TableOperationRegistry
 from .token_manager import TokenManager
 
 # Configure logging for this module
@@ -100,7 +105,7 @@ class RestaurantMockClient:
             "Called load_products, but products are already loaded in __init__."
         )
 
-    def _load_mock_products(self) -> Dict[int, Product]:
+    def _load_mock_products(self) -> ProductCatalog:
         """
         Initialize a set of mock products with realistic Portuguese names and unique IDs.
         """
@@ -128,11 +133,10 @@ class RestaurantMockClient:
             {"id": 2020, "name": "Quindim Tradicional"},
         ]
 
-        products = {
-            item["id"]: Product(id=item["id"], name=item["name"])
-            for item in predefined_items
-        }
-        logger.debug(f"Mock products loaded: {products}")
+        products = ProductCatalog(
+            Product(id=item["id"], name=item["name"]) for item in predefined_items
+        )
+        logger.debug(f"Mock products loaded: {len(products)}")
         return products
 
     def _load_mock_tables(self) -> List[Table]:
@@ -255,8 +259,8 @@ class RestaurantMockClient:
                 "total": round(total, 2),
                 "globalDiscount": round(random.uniform(0.0, 20.0), 2),
             }
-            await asyncio.sleep(
-                random.uniform(0.05, 0.2)
+            await within_deadline(
+                asyncio.sleep(random.uniform(0.05, 0.2)), "mock PoS call"
             )  # Simulate asynchronous operation
             logger.debug(f"Fetched table content: {mock_table_content}")
 
@@ -298,8 +302,8 @@ class RestaurantMockClient:
                 logger.warning("Token expired while fetching tables.")
                 raise HTTPException(status_code=401, detail="Token expired")
 
-            await asyncio.sleep(
-                random.uniform(0.05, 0.2)
+            await within_deadline(
+                asyncio.sleep(random.uniform(0.05, 0.2)), "mock PoS call"
             )  # Simulate asynchronous operation
             logger.debug(f"Fetched {len(self.tables)} mock tables.")
             wire_trace = None
@@ -318,24 +322,61 @@ class RestaurantMockClient:
             logger.exception(f"Unexpected error in fetch_tables: {e}")
             raise HTTPException(status_code=500, detail="Erro interno do servidor.")
 
-    async def prebill(self, table_id: int) -> str:
+    async def prebill(
+        self,
+        table_id: int,
+        table_content: Optional[Dict] = None,
+        guid: Optional[str] = None,
+    ) -> str:
         """
         Mock method to simulate the prebill action.
         Similar logic to RestaurantClient's prebill method:
-        - Fetch table content
+        - Reuse a recently cached board or fetch table content
         - If no orders, 404
         - Otherwise, simulate posting the queue and return success.
+        The guid is accepted for parity; the mock has no POSTQUEUE to tag.
         """
-        result, _ = await self._prebill(table_id=table_id, include_trace=False)
+        result, _ = await self._shared_prebill(table_id, table_content)
         return result
 
-    async def prebill_with_trace(self, table_id: int) -> Dict[str, Any]:
+    async def prebill_with_trace(
+        self,
+        table_id: int,
+        table_content: Optional[Dict] = None,
+        guid: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """Mocked prebill with trace metadata."""
-        result, trace = await self._prebill(table_id=table_id, include_trace=True)
+        result, trace = await self._shared_prebill(table_id, table_content)
         return {"result": result, "wire_trace": trace}
 
+    async def _shared_prebill(
+        self, table_id: int, table_content: Optional[Dict]
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Share concurrent prebills of a table, like RestaurantClient does."""
+        return await TableOperationRegistry().prebill(
+            table_id,
+            lambda: self._prebill(
+                table_id=table_id, include_trace=True, table_content=table_content
+            ),
+        )
+
+    async def _get_prebill_board(self, table_id: int) -> Dict:
+        """Reuse a board cached within `prebill_board_max_age` or fetch a new one."""
+        max_age = get_settings().prebill_board_max_age
+        content = get_fresh_table_content(table_id, max_age)
+        if content is not None:
+            logger.debug(f"Reusing cached board for prebill of table ID: {table_id}")
+            return content
+
+        content = await self.fetch_table_content(table_id)
+        store_table_content(table_id, content)
+        return content
+
     async def _prebill(
-        self, table_id: int, include_trace: bool = False
+        self,
+        table_id: int,
+        include_trace: bool = False,
+        table_content: Optional[Dict] = None,
     ) -> Tuple[str, Optional[Dict[str, Any]]]:
         """Internal helper for prebill with optional trace."""
         logger.info(f"Initiating prebill for table ID: {table_id}")
@@ -345,7 +386,9 @@ class RestaurantMockClient:
                 logger.warning("Token expired while initiating prebill.")
                 raise HTTPException(status_code=401, detail="Token expired")
 
-            content = await self.fetch_table_content(table_id)
+            content = table_content
+            if content is None:
+                content = await self._get_prebill_board(table_id)
             orders = content.get("content", [])
             if not orders:
                 logger.warning(
@@ -357,8 +400,8 @@ class RestaurantMockClient:
 
             self.tables[table_id - 1].status = 2
             self.tables[table_id - 1].freeTable = False
-            await asyncio.sleep(
-                random.uniform(0.05, 0.2)
+            await within_deadline(
+                asyncio.sleep(random.uniform(0.05, 0.2)), "mock PoS call"
             )  # Simulate asynchronous operation
             logger.info(f"Prebill posted successfully for table ID: {table_id}.")
 
@@ -381,16 +424,20 @@ class RestaurantMockClient:
             logger.exception(f"Unexpected error in prebill: {e}")
             raise HTTPException(status_code=500, detail="Erro interno do servidor.")
 
-    async def close_table(self, table_id: int) -> str:
+    async def close_table(self, table_id: int, guid: Optional[str] = None) -> str:
         """
         Mock method to simulate closing a table, as per the close_table method in RestaurantClient.
         """
-        result, _ = await self._close_table(table_id=table_id, include_trace=False)
+        async with TableOperationRegistry().lock(table_id):
+            result, _ = await self._close_table(table_id=table_id, include_trace=False)
         return result
 
-    async def close_table_with_trace(self, table_id: int) -> Dict[str, Any]:
+    async def close_table_with_trace(
+        self, table_id: int, guid: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Close a table and include a mock wire trace."""
-        result, trace = await self._close_table(table_id=table_id, include_trace=True)
+        async with TableOperationRegistry().lock(table_id):
+            result, trace = await self._close_table(table_id=table_id, include_trace=True)
         return {"result": result, "wire_trace": trace}
 
     async def _close_table(
@@ -410,8 +457,8 @@ class RestaurantMockClient:
 
             self.tables[table_id - 1].status = 0
             self.tables[table_id - 1].freeTable = True
-            await asyncio.sleep(
-                random.uniform(0.05, 0.2)
+            await within_deadline(
+                asyncio.sleep(random.uniform(0.05, 0.2)), "mock PoS call"
             )  # Simulate asynchronous operation
             logger.info(f"Table ID {table_id} closed successfully.")
 
@@ -0,0 +1,268 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+Endpoint = Tuple[str, int]
+
+
+class PosEndpointResolver:
+    """
+    Keep track of where the XD server listens and find it again when it moves.
+
+    The configured primary host and fallbacks are probed first; if none answers,
+    the local /24 (or the configured subnet) is scanned concurrently on the PoS
+    port. A candidate only counts once it answers a protocol request with a
+    reply ending in [EOM], so another service listening on the port is not
+    mistaken for the PoS. The winner is cached on disk, along with the
+    configured primary, and used until repeated connect failures trigger a new
+    discovery; a cache written for another pos_host/pos_port is ignored.
+    """
+
+    _instance: Optional["PosEndpointResolver"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    PROBE_TIMEOUT: float = 0.5  # TCP connect timeout per candidate
+    PROBE_READ_TIMEOUT: float = 1.0  # Time for a candidate to answer the probe request
+    PROBE_READ_LIMIT: int = 64 * 1024  # Bytes read before giving up on a reply
+    END_OF_MESSAGE = "[EOM]"
+    # A one-row table-status list: any XD server answers it (an error or
+    # NOTAUTHORIZED reply still ends in [EOM]) without needing a token
+    PROBE_MESSAGE = (
+        "GETDATALIST"
+        "[NP]OBJECTTYPE[EQ]XDPeople.Entities.MobileBoardStatus"
+        "[NP]PART[EQ]0[NP]LIMIT[EQ]1"
+        "[NP]MESSAGETYPE[EQ]XDPeople.Entities.GetDataListMessage"
+        "[EOM]"
+    )
+    SCAN_CONCURRENCY: int = 64
+    REDISCOVERY_COOLDOWN: float = 30.0  # Minimum seconds between discoveries
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(PosEndpointResolver, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, state_file: str = "pos_endpoint_state.json"):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.port: int = settings.pos_port
+            self.primary: Endpoint = (settings.pos_host, settings.pos_port)
+            self.fallbacks: List[Endpoint] = [
+                (host, settings.pos_port) for host in settings.pos_fallback_hosts
+            ]
+            self.scan_subnet: Optional[str] = settings.pos_discovery_subnet
+            self.failure_threshold: int = settings.pos_discovery_failure_threshold
+            self._state_file = state_file
+            self.endpoint: Endpoint = self.primary
+            self.discovered_at: Optional[float] = None
+            self.consecutive_failures = 0
+            self._last_discovery_at: Optional[float] = None
+            self._discovery_task: Optional[asyncio.Task] = None
+            self._load_from_file()
+            self._initialized = True  # Prevent re-initialization
+
+    def _load_from_file(self):
+        """Restore the last discovered endpoint, unless the configuration changed."""
+        if not os.path.exists(self._state_file):
+            return
+        try:
+            with open(self._state_file, "r") as f:
+                data = json.load(f)
+            primary = data.get("primary") or {}
+            if (primary.get("host"), primary.get("port")) != self.primary:
+                logger.info(
+                    f"PoS endpoint cache ignored: it was written for another primary ({primary})."
+                )
+                return
+            self.endpoint = (data["host"], int(data["port"]))
+            self.discovered_at = data.get("discovered_at")
+            logger.info(f"PoS endpoint loaded from cache: {self.endpoint}")
+        except Exception as e:
+            logger.error(f"Failed to load PoS endpoint cache: {e}")
+
+    def _save_to_file(self):
+        """Persist the current endpoint atomically."""
+        tmp_file = f"{self._state_file}.tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(
+                    {
+                        "host": self.endpoint[0],
+                        "port": self.endpoint[1],
+                        "discovered_at": self.discovered_at,
+                        "primary": {"host": self.primary[0], "port": self.primary[1]},
+                    },
+                    f,
+                )
+            os.replace(tmp_file, self._state_file)
+        except Exception as e:
+            logger.error(f"Failed to save PoS endpoint cache: {e}")
+
+    def current(self) -> Endpoint:
+        """Return the endpoint PoS traffic should go to."""
+        return self.endpoint
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the resolver state for diagnostics."""
+        return {
+            "endpoint": {"host": self.endpoint[0], "port": self.endpoint[1]},
+            "primary": {"host": self.primary[0], "port": self.primary[1]},
+            "fallbacks": [{"host": host, "port": port} for host, port in self.fallbacks],
+            "discovered_at": self.discovered_at,
+            "consecutive_failures": self.consecutive_failures,
+            "discovery_in_progress": self._discovery_task is not None
+            and not self._discovery_task.done(),
+        }
+
+    def report_success(self):
+        """Reset the failure counter after a successful exchange."""
+        self.consecutive_failures = 0
+
+    def report_connect_failure(self):
+        """
+        Count a failed connection; past the threshold, start a background
+        discovery so the following requests go to the server's new address.
+        """
+        self.consecutive_failures += 1
+        if self.consecutive_failures < self.failure_threshold:
+            return
+        if (
+            self._last_discovery_at is not None
+            and time.monotonic() - self._last_discovery_at < self.REDISCOVERY_COOLDOWN
+        ):
+            return
+        logger.warning(
+            f"{self.consecutive_failures} consecutive PoS connect failures on {self.endpoint}, rediscovering."
+        )
+        self._start_discovery()
+
+    def _start_discovery(self) -> asyncio.Task:
+        """Start a discovery round unless one is already running."""
+        if self._discovery_task is None or self._discovery_task.done():
+            self._discovery_task = asyncio.get_running_loop().create_task(
+                self._discover()
+            )
+        return self._discovery_task
+
+    async def discover(self) -> Optional[Endpoint]:
+        """Run (or join) a discovery round and return the endpoint found."""
+        return await asyncio.shield(self._start_discovery())
+
+    async def _discover(self) -> Optional[Endpoint]:
+        self._last_discovery_at = time.monotonic()
+        started_at = time.monotonic()
+
+        known = self._known_candidates()
+        endpoint = await self._first_reachable(known)
+        if endpoint is None:
+            endpoint = await self._first_reachable(self._subnet_candidates(known))
+
+        elapsed = time.monotonic() - started_at
+        if endpoint is None:
+            logger.error(f"PoS discovery found no server on port {self.port} ({elapsed:.1f}s).")
+            return None
+
+        logger.info(f"PoS server found at {endpoint[0]}:{endpoint[1]} ({elapsed:.1f}s).")
+        self.endpoint = endpoint
+        self.discovered_at = time.time()
+        self.consecutive_failures = 0
+        self._save_to_file()
+        return endpoint
+
+    def _known_candidates(self) -> List[Endpoint]:
+        """Primary, fallbacks and the cached endpoint, in preference order."""
+        candidates: List[Endpoint] = []
+        for endpoint in [self.primary, *self.fallbacks, self.endpoint]:
+            if endpoint not in candidates:
+                candidates.append(endpoint)
+        return candidates
+
+    def _subnet_candidates(self, exclude: List[Endpoint]) -> List[Endpoint]:
+        """Every host of the scan subnet on the PoS port."""
+        try:
+            if self.scan_subnet:
+                network = ipaddress.ip_network(self.scan_subnet, strict=False)
+            else:
+                network = ipaddress.ip_network(f"{self._local_ip()}/24", strict=False)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot determine the subnet to scan for the PoS: {e}")
+            return []
+        return [
+            (str(host), self.port)
+            for host in network.hosts()
+            if (str(host), self.port) not in exclude
+        ]
+
+    def _local_ip(self) -> str:
+        """Return the address of the interface routing towards the primary host."""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+            # No packet is sent; connect only selects the outgoing interface
+            udp_socket.connect((self.primary[0], self.port))
+            return udp_socket.getsockname()[0]
+
+    async def _first_reachable(self, candidates: List[Endpoint]) -> Optional[Endpoint]:
+        """Probe candidates concurrently and return the most preferred that answers."""
+        if not candidates:
+            return None
+        semaphore = asyncio.Semaphore(self.SCAN_CONCURRENCY)
+
+        async def probe(endpoint: Endpoint) -> bool:
+            async with semaphore:
+                return await self.probe(endpoint)
+
+        results = await asyncio.gather(*(probe(endpoint) for endpoint in candidates))
+        for endpoint, reachable in zip(candidates, results):
+            if reachable:
+                return endpoint
+        return None
+
+    async def probe(self, endpoint: Endpoint) -> bool:
+        """Check that the endpoint speaks the XD protocol: a cheap request gets an [EOM] reply."""
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*endpoint), timeout=self.PROBE_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        try:
+            writer.write(self.PROBE_MESSAGE.encode("ascii"))
+            await writer.drain()
+            reply = await asyncio.wait_for(
+                self._read_reply(reader), timeout=self.PROBE_READ_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        if not reply.endswith(self.END_OF_MESSAGE):
+            logger.debug(f"{endpoint[0]}:{endpoint[1]} accepts connections but is not an XD server.")
+            return False
+        return True
+
+    async def _read_reply(self, reader: asyncio.StreamReader) -> str:
+        """Read until the end-of-message marker, the server closes or the limit is hit."""
+        reply = ""
+        while len(reply) < self.PROBE_READ_LIMIT:
+            data = await reader.read(1024)
+            if not data:
+                break
+            reply += data.decode("ascii", errors="replace")
+            if reply.endswith(self.END_OF_MESSAGE):
+                break
+        return reply
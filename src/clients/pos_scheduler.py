@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from ..utils.deadline import within_deadline
+from ..utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class PosScheduler:
+    """
+    Priority queue in front of the PoS transport.
+
+    At most `limit` messages are in flight; when every slot is taken, waiting
+    messages are admitted by priority class (payment writes, then guest bill
+    reads, then panel reads) and in arrival order within a class. Slots reserved
+    for payments are never handed to reads, so a prebill or close does not wait
+    behind a burst of dashboard refreshes.
+
+    One scheduler serves every event loop of the process (the product load at
+    client start-up runs in its own asyncio.run()), so its state is guarded by
+    a threading lock and each waiter is woken on the loop it waits on.
+    """
+
+    PAYMENT = 0  # POSTQUEUE: prebill, close
+    GUEST = 1  # GETBOARDCONTENT: bill reads
+    PANEL = 2  # GETDATALIST: tables, products
+
+    PRIORITY_NAMES: Dict[int, str] = {PAYMENT: "payment", GUEST: "guest", PANEL: "panel"}
+    OPCODE_PRIORITIES: Dict[str, int] = {
+        "POSTQUEUE": PAYMENT,
+        "GETBOARDCONTENT": GUEST,
+        "GETDATALIST": PANEL,
+    }
+
+    WAIT_SAMPLES: int = 200  # Recent waits kept per class for percentiles
+
+    # Waiter states
+    WAITING = "waiting"
+    GRANTED = "granted"
+    ABANDONED = "abandoned"
+
+    _instance: Optional["PosScheduler"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(PosScheduler, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.limit: int = settings.pos_max_concurrency
+            self.reserved_for_payments: int = settings.pos_payment_reserved_slots
+            self.in_flight = 0
+            self._lock = Lock()  # Guards in_flight, the waiters and the metrics
+            # [priority, sequence, loop, future, state], ordered by the first two
+            self._waiters: List[List[Any]] = []
+            self._sequence = itertools.count()
+            self._metrics: Dict[int, Dict[str, Any]] = {
+                priority: {
+                    "admitted": 0,
+                    "queued": 0,
+                    "max_queue_depth": 0,
+                    "wait_total": 0.0,
+                    "wait_max": 0.0,
+                }
+                for priority in self.PRIORITY_NAMES
+            }
+            self._waits: Dict[int, Deque[float]] = {
+                priority: deque(maxlen=self.WAIT_SAMPLES)
+                for priority in self.PRIORITY_NAMES
+            }
+            self._initialized = True  # Prevent re-initialization
+
+    @staticmethod
+    def opcode_for(message: str) -> str:
+        """Return the message opcode (its first token, e.g. GETDATALIST)."""
+        return message.split("[", 1)[0]
+
+    @classmethod
+    def priority_for(cls, message: str) -> int:
+        """Infer the priority class from the message opcode."""
+        return cls.OPCODE_PRIORITIES.get(cls.opcode_for(message), cls.PANEL)
+
+    def _capacity(self, priority: int) -> int:
+        """Slots a class may occupy: reads leave the reserved ones to payments."""
+        if priority == self.PAYMENT:
+            return self.limit
+        return max(1, self.limit - self.reserved_for_payments)
+
+    @asynccontextmanager
+    async def slot(self, priority: int) -> AsyncIterator[None]:
+        """Hold a PoS slot for the duration of the block."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int):
+        """Wait for a slot; the wait is bounded by the request deadline."""
+        started_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = [priority, next(self._sequence), loop, future, self.WAITING]
+        metrics = self._metrics[priority]
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+            metrics["queued"] += 1
+            self._wake()
+            if waiter[4] == self.GRANTED:
+                self._record_admission(priority, 0.0)
+                return
+            metrics["max_queue_depth"] = max(metrics["max_queue_depth"], metrics["queued"])
+
+        try:
+            await within_deadline(future, "the wait for a PoS slot")
+        except BaseException:
+            with self._lock:
+                if waiter[4] == self.GRANTED:
+                    # Granted just as we gave up: hand the slot to the next waiter
+                    self.in_flight -= 1
+                    self._wake()
+                else:
+                    waiter[4] = self.ABANDONED
+                    metrics["queued"] -= 1
+            future.cancel()
+            raise
+        with self._lock:
+            self._record_admission(priority, time.perf_counter() - started_at)
+
+    def release(self):
+        """Free a slot and admit the next waiters."""
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def set_limit(self, limit: int):
+        """Change the concurrency limit; raising it admits waiters right away."""
+        with self._lock:
+            self.limit = max(1, limit)
+            self._wake()
+
+    def _wake(self):
+        """Admit waiters while slots are free (called with the lock held)."""
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        while self._waiters:
+            waiter = self._waiters[0]
+            priority, _, loop, future, state = waiter
+            if state == self.ABANDONED:
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self._capacity(priority):
+                # The head has the best priority; nothing behind it fits either
+                return
+            heapq.heappop(self._waiters)
+            self._metrics[priority]["queued"] -= 1
+            if loop is current_loop:
+                future.set_result(None)
+            else:
+                try:
+                    # Futures may only be resolved from their own loop's thread
+                    loop.call_soon_threadsafe(self._deliver, future)
+                except RuntimeError:
+                    # Its loop is closed: nobody is left to use the slot
+                    continue
+            waiter[4] = self.GRANTED
+            self.in_flight += 1
+
+    @staticmethod
+    def _deliver(future: asyncio.Future):
+        """Resolve a grant on the waiter's loop, unless the waiter already gave up."""
+        if not future.done():
+            future.set_result(None)
+
+    def _record_admission(self, priority: int, waited: float):
+        metrics = self._metrics[priority]
+        metrics["admitted"] += 1
+        metrics["wait_total"] += waited
+        metrics["wait_max"] = max(metrics["wait_max"], waited)
+        self._waits[priority].append(waited)
+
+    def status(self) -> Dict[str, Any]:
+        """Queue depths and wait times per priority class, for diagnostics."""
+        with self._lock:
+            classes = {}
+            for priority, name in self.PRIORITY_NAMES.items():
+                metrics = self._metrics[priority]
+                waits = sorted(self._waits[priority])
+                classes[name] = {
+                    "queued": metrics["queued"],
+                    "max_queue_depth": metrics["max_queue_depth"],
+                    "admitted": metrics["admitted"],
+                    "wait_avg": metrics["wait_total"] / metrics["admitted"]
+                    if metrics["admitted"]
+                    else 0.0,
+                    "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "wait_max": metrics["wait_max"],
+                }
+            return {
+                "limit": self.limit,
+                "reserved_for_payments": self.reserved_for_payments,
+                "in_flight": self.in_flight,
+                "classes": classes,
+            }
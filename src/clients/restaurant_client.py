@@ -2,13 +2,28 @@ import base64
 import logging
 import asyncio
 import json
+import time
 import uuid
-from typing import Any, Dict, List, Optional, Tuple, Type
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
 from fastapi import HTTPException
+from pydantic import TypeAdapter
 from .token_manager import TokenManager
-from .tcp_client import TCPClient
+from .adaptive_limiter import AdaptiveConcurrencyLimiter
+from .circuit_breaker import PosCircuitBreaker
+from .latency_tracker import PosLatencyTracker
+from .pos_discovery import PosEndpointResolver
+from .pos_scheduler import PosScheduler
+from .table_operations import TableOperationRegistry
+from .tcp_client import TCPClient, TCPConnectError
 from ..builders.pos_message_builder import MessageBuilder
+from ..errors.deadline_exceeded_error import DeadlineExceededError
+from ..errors.pos_unavailable_error import PosUnavailableError
 from ..models.entity_models import Product, Table
+from ..models.product_catalog import CatalogProduct, ProductCatalog
+from ..services.table_cache import get_fresh_table_content, store_table_content
+from ..utils.deadline import bounded_timeout, check_deadline, within_deadline
+from ..utils.settings import get_settings
 
 # Configure the logger
 logger = logging.getLogger("RestaurantClient")
@@ -31,6 +46,35 @@ logger.addHandler(console_handler)
 logger.addHandler(file_handler)
 
 
+DEBUG_PREVIEW_CHARS = 200  # PoS payloads logged at DEBUG are cut to this length
+DEBUG_PREVIEW_ITEMS = 3  # List payloads: only these first items are formatted
+
+
+def _debug_preview(label: str, value: Any):
+    """
+    Log the start of a PoS payload at DEBUG.
+
+    Product lists run to thousands of rows: nothing is formatted unless DEBUG
+    is enabled, and then only the first items/characters.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if isinstance(value, list) and len(value) > DEBUG_PREVIEW_ITEMS:
+        # Never repr the whole list just to throw most of it away
+        text = f"{value[:DEBUG_PREVIEW_ITEMS]!r}... ({len(value)} items)"
+    else:
+        text = value if isinstance(value, str) else repr(value)
+    if len(text) > DEBUG_PREVIEW_CHARS:
+        text = f"{text[:DEBUG_PREVIEW_CHARS]}... ({len(text)} chars)"
+    logger.debug("%s: %s", label, text)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model_class: Type) -> TypeAdapter:
+    """Validator for a whole GETDATALIST payload of `model_class`, in one pass."""
+    return TypeAdapter(List[model_class])
+
+
 class RestaurantClient:
     _instance: Optional["RestaurantClient"] = None
 
@@ -40,21 +84,37 @@ class RestaurantClient:
     PROTOCOL_VERSION: str = "1"
     TOKEN: str = ""
     LIMIT: int = 5000
+    POSTQUEUE_RETRIES: int = 2  # Extra attempts for writes sent with a stable guid
+    POSTQUEUE_RETRY_BACKOFF: float = 0.25
 
     message_builder: MessageBuilder
-    products: Dict[str, Product]
+    products: ProductCatalog
     token_manager: TokenManager
+    endpoint_resolver: PosEndpointResolver
+    circuit_breaker: PosCircuitBreaker
+    scheduler: PosScheduler
+    concurrency_limiter: AdaptiveConcurrencyLimiter
+    latency_tracker: PosLatencyTracker
+    table_operations: TableOperationRegistry
 
     def __new__(cls, token_manager: TokenManager):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.products = {}
+            cls._instance.products = ProductCatalog()
             cls._instance.message_builder = MessageBuilder(
                 user_id=cls.USER_ID,
                 app_version=cls.APP_VERSION,
                 protocol_version=cls.PROTOCOL_VERSION,
             )
             cls._instance.token_manager = token_manager
+            cls._instance.endpoint_resolver = PosEndpointResolver()
+            cls._instance.circuit_breaker = PosCircuitBreaker()
+            cls._instance.scheduler = PosScheduler()
+            cls._instance.concurrency_limiter = AdaptiveConcurrencyLimiter(
+                cls._instance.scheduler
+            )
+            cls._instance.latency_tracker = PosLatencyTracker()
+            cls._instance.table_operations = TableOperationRegistry()
             logger.debug("RestaurantClient instance created.")
         return cls._instance
 
@@ -115,13 +175,13 @@ class RestaurantClient:
             products = await self._fetch_data_list(
                 object_type="XDPeople.Entities.MobileItem", model_class=Product
             )
-            self.products = {str(product.id): product for product in products}
+            self.products = ProductCatalog(products)
             logger.info(f"Product cache initialized with {len(self.products)} items.")
         except Exception as e:
             logger.error(f"Failed to load products: {e}", exc_info=True)
             raise
 
-    async def _fetch_product(self, product_id: str) -> Optional[Product]:
+    async def _fetch_product(self, product_id: str) -> Optional[CatalogProduct]:
         """Fetch a product from the cache by ID, reloading if necessary."""
         if not self.products:
             logger.warning("Product cache is empty. Attempting to reload products.")
@@ -154,7 +214,8 @@ class RestaurantClient:
         try:
             encoded_object = self._extract_field(response, "[NP]OBJECT[EQ]")
             decoded_json = self._decode_base64_json(encoded_object)
-            return [model_class(**item) for item in decoded_json]
+            self.latency_tracker.record_rows(message, len(decoded_json))
+            return _list_adapter(model_class).validate_python(decoded_json)
         except ValueError as e:
             # Verifica se a exceção diz respeito ao campo "[NP]OBJECT[EQ]" não encontrado
             if "No NP]OBJECT[EQ field found in the response" in str(e):
@@ -176,29 +237,130 @@ class RestaurantClient:
             )
 
     async def _send_message(self, message: str) -> Optional[str]:
-        """Send a message to the TCP server and return the response."""
-        logger.debug(f"Sending message to TCP server: {message}")
-        with TCPClient() as client:
-            loop = asyncio.get_event_loop()
+        """
+        Send a message to the TCP server and return the response.
+
+        The message first waits for a PoS slot in the scheduler (payments
+        before bill reads before panel reads), then goes out on its own
+        connection. Only PoS authentication errors invalidate the token.
+        """
+        _debug_preview("Sending message to TCP server", message)
+        check_deadline("sending the PoS message")
+        priority = self.scheduler.priority_for(message)
+        async with self.scheduler.slot(priority):
+            response = await self._exchange(message)
+
+        _debug_preview("Received response", response)
+        if self._is_authentication_error(response):
+            logger.warning("Authentication error detected in response.")
+            await self.token_manager.set_unauthenticated()
+            raise HTTPException(
+                status_code=401,
+                detail="Authentication error: token expired or invalid",
+            )
+        return response
+
+    async def _exchange(self, message: str) -> str:
+        """
+        Run one request/response exchange with the PoS.
+
+        The read timeout is learned per message kind (see PosLatencyTracker);
+        both timeouts are cut down to the time left before the request
+        deadline; when the deadline is what expired, a 504 is raised and
+        the breaker is not charged. Other transport failures feed the circuit
+        breaker and the concurrency limiter and raise a 503 without touching
+        the token.
+        """
+        self.circuit_breaker.before_call()
+        settings = get_settings()
+        # Opcode plus object type: a table list and the product catalog are both
+        # GETDATALIST but have very different latencies
+        kind = self.latency_tracker.key_for(message)
+        connect_timeout = bounded_timeout(settings.pos_connect_timeout)
+        read_budget = self.latency_tracker.read_timeout(message)
+        read_timeout = bounded_timeout(read_budget)
+        target_ip, target_port = self.endpoint_resolver.current()
+        client = TCPClient(target_ip=target_ip, target_port=target_port)
+        started_at = time.perf_counter()
+        try:
+            response = await client.send_data_async(
+                message, connect_timeout=connect_timeout, read_timeout=read_timeout
+            )
+        except TCPConnectError as e:
+            timed_out = isinstance(e.__cause__, asyncio.TimeoutError)
+            if timed_out and connect_timeout < settings.pos_connect_timeout:
+                # The deadline, not the PoS, cut the connection attempt short
+                self.circuit_breaker.release()
+                raise DeadlineExceededError("Deadline exceeded while connecting to the PoS.")
+            logger.error(f"Failed to connect to PoS at {target_ip}:{target_port}: {e}")
+            self.endpoint_resolver.report_connect_failure()
+            self._record_transport_failure(kind, f"connect: {e}")
+            raise PosUnavailableError(
+                f"Unable to connect to the PoS at {target_ip}:{target_port}."
+            )
+        except asyncio.TimeoutError:
+            if read_timeout < read_budget:
+                self.circuit_breaker.release()
+                raise DeadlineExceededError("Deadline exceeded while waiting for the PoS.")
+            logger.error(f"PoS did not answer within {read_timeout:.1f}s.")
+            self.latency_tracker.record_timeout(message, read_timeout)
+            self._record_transport_failure(kind, "read timeout")
+            raise PosUnavailableError("Timed out waiting for the PoS response.")
+        except asyncio.CancelledError:
+            # Client went away: the connection is already closed, no verdict
+            self.circuit_breaker.release()
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send message: {e}", exc_info=True)
+            self._record_transport_failure(kind, f"send: {e}")
+            raise PosUnavailableError(f"Failed to send message: {e}")
+        self.endpoint_resolver.report_success()
+
+        if not response:
+            logger.error("No response received from the PoS.")
+            self._record_transport_failure(kind, "no response")
+            raise PosUnavailableError("Failed to receive response from the TCP server")
+
+        latency = time.perf_counter() - started_at
+        self.circuit_breaker.record_success()
+        self.concurrency_limiter.record_success(kind, latency)
+        self.latency_tracker.record(message, latency)
+        return response
+
+    async def _send_post_queue(
+        self, build_message: Callable[[], Awaitable[str]], guid: Optional[str]
+    ) -> Tuple[str, str]:
+        """
+        Send a POSTQUEUE and return the message sent along with the response.
+
+        With a caller-supplied guid the XD server applies the action once, so
+        transient transport failures are retried under that same guid. The
+        message is rebuilt on each attempt to pick up a renewed token. Without
+        a guid the write is sent once: a retry could apply it twice.
+        """
+        retries = self.POSTQUEUE_RETRIES if guid else 0
+        attempt = 0
+        while True:
+            message = await build_message()
             try:
-                response = await loop.run_in_executor(None, client.send_data, message)
-                logger.debug(f"Received response: {response}")
-
-                if self._is_authentication_error(response):
-                    logger.warning("Authentication error detected in response.")
-                    await self.token_manager.set_unauthenticated()
-                    raise HTTPException(
-                        status_code=401,
-                        detail="Authentication error: token expired or invalid",
-                    )
-                return response
-            except Exception as e:
-                logger.error(f"Failed to send message: {e}", exc_info=True)
-                await self.token_manager.set_unauthenticated()
-                raise HTTPException(
-                    status_code=500, detail=f"Failed to send message: {e}"
+                return message, await self._send_message(message)
+            except PosUnavailableError as e:
+                if not e.transient or attempt >= retries:
+                    raise
+                attempt += 1
+                logger.warning(
+                    f"POSTQUEUE {guid} failed ({e.detail}); retry {attempt}/{retries}."
+                )
+                await within_deadline(
+                    asyncio.sleep(self.POSTQUEUE_RETRY_BACKOFF * 2 ** (attempt - 1)),
+                    "the POSTQUEUE retry",
                 )
 
+    def _record_transport_failure(self, kind: str, reason: str):
+        """Charge a transport failure to the circuit breaker and the limiter."""
+        self.circuit_breaker.record_failure(reason)
+        self.concurrency_limiter.record_failure(kind)
+
     def _is_authentication_error(self, response: str) -> bool:
         """Check if the response indicates an authentication error."""
         auth_error = "AuthError" in response  # Replace with actual auth error indicator
@@ -243,7 +405,7 @@ class RestaurantClient:
             table_content = self._extract_and_decode_field(
                 response, "[NP]BOARDINFO[EQ]"
             )
-            logger.debug(f"Raw table content: {table_content}")
+            _debug_preview("Raw table content", table_content)
 
             await self._enrich_table_content_with_product_names(table_content)
             logger.info(f"Enriched table content for table ID {table_id}.")
@@ -257,6 +419,9 @@ class RestaurantClient:
                     pos_message=message,
                 )
             return table_content, wire_trace
+        except HTTPException:
+            # Keep 401/404/503 as raised (auth, missing data, PoS unavailable)
+            raise
         except Exception as e:
             logger.error(f"Failed to fetch table content: {e}", exc_info=True)
             raise HTTPException(
@@ -268,7 +433,7 @@ class RestaurantClient:
         logger.debug(f"Extracting field '{field_identifier}' from response.")
         encoded_field = self._extract_field(response, field_identifier)
         decoded = self._decode_base64_json(encoded_field)
-        logger.debug(f"Decoded field '{field_identifier}': {decoded}")
+        _debug_preview(f"Decoded field '{field_identifier}'", decoded)
         return decoded
 
     async def _enrich_table_content_with_product_names(self, table_content: Dict):
@@ -315,7 +480,8 @@ class RestaurantClient:
 
             encoded_object = self._extract_field(response, "[NP]OBJECT[EQ]")
             decoded_json = self._decode_base64_json(encoded_object)
-            tables = [Table(**item) for item in decoded_json]
+            self.latency_tracker.record_rows(message, len(decoded_json))
+            tables = _list_adapter(Table).validate_python(decoded_json)
 
             wire_trace = None
             if include_trace:
@@ -338,29 +504,87 @@ class RestaurantClient:
                 status_code=500,
                 detail=f"Failed to decode or process the response: {str(e)}",
             )
+        except HTTPException:
+            # Keep 401/404/503 as raised (auth, missing data, PoS unavailable)
+            raise
         except Exception as e:
             logger.error(f"Failed to fetch tables: {e}", exc_info=True)
             raise HTTPException(
                 status_code=500, detail=f"Failed to fetch tables: {str(e)}"
             )
 
-    async def prebill(self, table_id: int) -> str:
+    async def prebill(
+        self,
+        table_id: int,
+        table_content: Optional[Dict] = None,
+        guid: Optional[str] = None,
+    ) -> str:
         """Send a POSTQUEUE message to close a table's order."""
-        response, _ = await self._prebill(table_id=table_id, include_trace=False)
+        response, _ = await self._shared_prebill(table_id, table_content, guid)
         return response
 
-    async def prebill_with_trace(self, table_id: int) -> Dict[str, Any]:
+    async def prebill_with_trace(
+        self,
+        table_id: int,
+        table_content: Optional[Dict] = None,
+        guid: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """Send a POSTQUEUE message to close a table's order with wire trace."""
-        response, wire_trace = await self._prebill(table_id=table_id, include_trace=True)
+        response, wire_trace = await self._shared_prebill(table_id, table_content, guid)
         return {"result": response, "wire_trace": wire_trace}
 
+    async def _shared_prebill(
+        self,
+        table_id: int,
+        table_content: Optional[Dict],
+        guid: Optional[str],
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Prebill through the per-table registry: concurrent prebills for a table
+        share one board read and one POSTQUEUE (the first caller's), and a close
+        in progress is waited for. The trace is always built so every caller
+        sharing the write can get it.
+        """
+        return await self.table_operations.prebill(
+            table_id,
+            lambda: self._prebill(
+                table_id=table_id,
+                include_trace=True,
+                table_content=table_content,
+                guid=guid,
+            ),
+        )
+
+    async def _get_prebill_board(self, table_id: int) -> Dict:
+        """
+        Return the board used to validate a prebill.
+
+        A board cached within `prebill_board_max_age` seconds (typically the one
+        just fetched for the bill message) is reused instead of issuing another
+        GETBOARDCONTENT; otherwise the board is fetched and cached.
+        """
+        max_age = get_settings().prebill_board_max_age
+        table_content = get_fresh_table_content(table_id, max_age)
+        if table_content is not None:
+            logger.debug(f"Reusing cached board for prebill of table ID: {table_id}")
+            return table_content
+
+        table_content = await self.fetch_table_content(table_id)
+        store_table_content(table_id, table_content)
+        return table_content
+
     async def _prebill(
-        self, table_id: int, include_trace: bool = False
+        self,
+        table_id: int,
+        include_trace: bool = False,
+        table_content: Optional[Dict] = None,
+        guid: Optional[str] = None,
     ) -> Tuple[str, Optional[Dict[str, Any]]]:
         """Internal helper to execute prebill with optional trace."""
         logger.info(f"Initiating prebill for table ID: {table_id}")
         try:
-            table_content = await self.fetch_table_content(table_id)
+            if table_content is None:
+                table_content = await self._get_prebill_board(table_id)
             orders = table_content.get("content", [])
             if not orders:
                 logger.warning(f"No orders found for table ID: {table_id}")
@@ -368,10 +592,15 @@ class RestaurantClient:
                     status_code=404, detail="No orders found for the table."
                 )
 
-            message = await self.message_builder.build_prebill_message(
-                employee_id=int(self.USER_ID), table=table_id, orders=orders
+            message, response = await self._send_post_queue(
+                lambda: self.message_builder.build_prebill_message(
+                    employee_id=int(self.USER_ID),
+                    table=table_id,
+                    orders=orders,
+                    guid=guid,
+                ),
+                guid=guid,
             )
-            response = await self._send_message(message)
 
             if not response:
                 logger.error(
@@ -400,35 +629,46 @@ class RestaurantClient:
 
             logger.info(f"Prebill response for table ID {table_id}: {response}")
             return response, wire_trace
+        except HTTPException:
+            # Keep 401/404/503 as raised (auth, missing data, PoS unavailable)
+            raise
         except Exception as e:
             logger.error(f"Failed to post queue: {e}", exc_info=True)
             raise HTTPException(
                 status_code=500, detail=f"Failed to post queue: {str(e)}"
             )
 
-    async def close_table(self, table_id: int) -> str:
+    async def close_table(self, table_id: int, guid: Optional[str] = None) -> str:
         """Send a POSTQUEUE message to close the table after payment."""
-        response, _ = await self._close_table(table_id=table_id, include_trace=False)
+        async with self.table_operations.lock(table_id):
+            response, _ = await self._close_table(
+                table_id=table_id, include_trace=False, guid=guid
+            )
         return response
 
-    async def close_table_with_trace(self, table_id: int) -> Dict[str, Any]:
+    async def close_table_with_trace(
+        self, table_id: int, guid: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Send a POSTQUEUE message to close the table after payment and include the wire trace."""
-        response, wire_trace = await self._close_table(
-            table_id=table_id, include_trace=True
-        )
+        async with self.table_operations.lock(table_id):
+            response, wire_trace = await self._close_table(
+                table_id=table_id, include_trace=True, guid=guid
+            )
         return {"result": response, "wire_trace": wire_trace}
 
     async def _close_table(
-        self, table_id: int, include_trace: bool = False
+        self, table_id: int, include_trace: bool = False, guid: Optional[str] = None
     ) -> Tuple[str, Optional[Dict[str, Any]]]:
         """Internal helper to close the table with optional wire trace."""
         logger.info(f"Closing table ID: {table_id}")
         try:
-            message = await self.message_builder.build_close_table_message(
-                employee_id=int(self.USER_ID), table=table_id
+            message, response = await self._send_post_queue(
+                lambda: self.message_builder.build_close_table_message(
+                    employee_id=int(self.USER_ID), table=table_id, guid=guid
+                ),
+                guid=guid,
             )
             logger.debug(f"Close Table Message: {message}")
-            response = await self._send_message(message)
 
             if not response:
                 logger.error(
@@ -457,6 +697,9 @@ class RestaurantClient:
 
             logger.info(f"Close table response for table ID {table_id}: {response}")
             return response, wire_trace
+        except HTTPException:
+            # Keep 401/404/503 as raised (auth, missing data, PoS unavailable)
+            raise
         except Exception as e:
             logger.error(f"Failed to close table: {e}", exc_info=True)
             raise HTTPException(
@@ -485,7 +728,7 @@ class RestaurantClient:
             raise ValueError(error_msg)
 
         extracted = encoded_field[:end].strip()
-        logger.debug(f"Extracted encoded field: {extracted}")
+        _debug_preview("Extracted encoded field", extracted)
         return extracted
 
     @staticmethod
@@ -496,7 +739,7 @@ class RestaurantClient:
             decoded_bytes = base64.b64decode(encoded_str)
             decoded_str = decoded_bytes.decode("utf-8")
             decoded_json = json.loads(decoded_str)
-            logger.debug(f"Decoded JSON: {decoded_json}")
+            _debug_preview("Decoded JSON", decoded_json)
             return decoded_json
         except Exception as e:
             error_msg = f"Error during Base64 decoding or JSON parsing: {e}"
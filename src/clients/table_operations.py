@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..utils.deadline import within_deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TableOperationRegistry:
+    """
+    Serialize PoS writes per table and share concurrent prebills.
+
+    Each table has an asyncio lock held by its prebill and close writes, so a
+    close waits for a prebill in flight (and the other way around). While a
+    prebill for a table is running, further prebill requests for that table
+    do not send their own board read and POSTQUEUE: they wait for the running
+    one and get its result.
+    """
+
+    _instance: Optional["TableOperationRegistry"] = None
+    _singleton_lock = Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(TableOperationRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            self._locks: Dict[int, asyncio.Lock] = {}
+            self._lock_users: Dict[int, int] = {}
+            self._prebills: Dict[int, "asyncio.Task[Any]"] = {}
+            self.coalesced_prebills = 0
+            self._initialized = True  # Prevent re-initialization
+
+    @asynccontextmanager
+    async def lock(self, table_id: int) -> AsyncIterator[None]:
+        """Hold the table's write lock; the wait is bounded by the request deadline."""
+        table_lock = self._locks.setdefault(table_id, asyncio.Lock())
+        self._lock_users[table_id] = self._lock_users.get(table_id, 0) + 1
+        try:
+            await within_deadline(table_lock.acquire(), f"the wait for table {table_id}")
+            try:
+                yield
+            finally:
+                table_lock.release()
+        finally:
+            self._lock_users[table_id] -= 1
+            if not self._lock_users[table_id]:
+                # Nobody holds or waits for it: drop it so the registry stays small
+                del self._lock_users[table_id]
+                del self._locks[table_id]
+
+    async def prebill(self, table_id: int, run: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `run()` under the table lock, or join the prebill already running
+        for this table. The write keeps going if its first caller disconnects.
+        """
+        task = self._prebills.get(table_id)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._locked(table_id, run))
+            self._prebills[table_id] = task
+            task.add_done_callback(lambda _: self._forget_prebill(table_id, task))
+        else:
+            self.coalesced_prebills += 1
+            logger.info(f"Joining the prebill already in flight for table {table_id}.")
+        return await within_deadline(asyncio.shield(task), f"the prebill of table {table_id}")
+
+    async def _locked(self, table_id: int, run: Callable[[], Awaitable[T]]) -> T:
+        async with self.lock(table_id):
+            return await run()
+
+    def _forget_prebill(self, table_id: int, task: "asyncio.Task[Any]"):
+        if self._prebills.get(table_id) is task:
+            del self._prebills[table_id]
+        if not task.cancelled():
+            task.exception()  # Retrieved here so an unawaited failure is not logged twice
+
+    def status(self) -> Dict[str, Any]:
+        """Tables with writes in progress, for diagnostics."""
+        return {
+            "tables_locked": sorted(
+                table_id for table_id, lock in self._locks.items() if lock.locked()
+            ),
+            "prebills_in_flight": sorted(self._prebills),
+            "coalesced_prebills": self.coalesced_prebills,
+        }
@@ -1,9 +1,14 @@
+import asyncio
 import socket
 import signal
 import sys
 import time
 
 
+class TCPConnectError(ConnectionError):
+    """The PoS did not accept the connection (refused, unreachable or timed out)."""
+
+
 class TCPClient:
     _instance = None  # Class-level attribute to hold the singleton instance
 
@@ -12,17 +17,24 @@ class TCPClient:
             cls._instance = super(TCPClient, cls).__new__(cls)
         return cls._instance
 
-    def __init__(
-        self, source_ip="127.0.0.1", target_ip="192.168.15.100", target_port=8978
-    ):
+    DEFAULT_TARGET_IP = "192.168.15.100"
+    DEFAULT_TARGET_PORT = 8978
+
+    def __init__(self, source_ip="127.0.0.1", target_ip=None, target_port=None):
         # Initialize only once
         if not hasattr(self, '_initialized'):
             self.source_ip = source_ip
-            self.target_ip = target_ip
-            self.target_port = target_port
+            self.target_ip = self.DEFAULT_TARGET_IP
+            self.target_port = self.DEFAULT_TARGET_PORT
             self.client_socket = None
             self.read_timeout = None  # Initialize read_timeout attribute
+            self.connect_error = None  # Last connection error, if any
             self._initialized = True  # Flag to prevent re-initialization
+        # The target may move (see PosEndpointResolver); explicit values win
+        if target_ip is not None:
+            self.target_ip = target_ip
+        if target_port is not None:
+            self.target_port = target_port
 
     def __enter__(self):
         """Enable using the class with a 'with' statement."""
@@ -35,6 +47,7 @@ class TCPClient:
 
     def connect(self, connect_timeout=None, read_timeout=None):
         """Establish the TCP connection."""
+        self.connect_error = None
         try:
             self.client_socket = self.create_socket()
             if connect_timeout is not None:
@@ -44,6 +57,7 @@ class TCPClient:
             if read_timeout is not None:
                 self.client_socket.settimeout(read_timeout)
         except Exception as e:
+            self.connect_error = e
             self.client_socket = None
 
     def create_socket(self):
@@ -93,6 +107,50 @@ class TCPClient:
             self.close()
             return None
 
+    async def send_data_async(self, message, connect_timeout=None, read_timeout=None):
+        """
+        Open a connection, send the message and read the full response on
+        asyncio streams.
+
+        Unlike `send_data`, nothing runs in an executor thread: when the caller
+        is cancelled (deadline or client disconnect) the read stops right away
+        and the connection is closed. Raises TCPConnectError when the server
+        cannot be reached and asyncio.TimeoutError when it does not answer in
+        `read_timeout` seconds. Returns None if the server closes the
+        connection without sending anything.
+        """
+        target = (self.target_ip, self.target_port)
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*target), timeout=connect_timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise TCPConnectError(
+                f"Unable to connect to {target[0]}:{target[1]}: {e!r}"
+            ) from e
+
+        try:
+            writer.write(message.encode("ascii"))
+            await writer.drain()
+            return await asyncio.wait_for(
+                self._read_response(reader), timeout=read_timeout
+            )
+        finally:
+            # Also runs on cancellation, so the socket is never left half-read
+            writer.close()
+
+    async def _read_response(self, reader):
+        """Read until the end-of-message marker or until the server closes."""
+        full_response = ""
+        while True:
+            response = await reader.read(1024)
+            if not response:
+                break
+            full_response += response.decode("ascii")
+            if self.is_end_of_message(full_response):
+                break
+        return full_response or None
+
     def is_end_of_message(self, response: str) -> bool:
         """Check if the end-of-message marker is reached."""
         return response.endswith("[EOM]") or "MESSAGEOK" in response
@@ -10,6 +10,7 @@ from typing import Optional
 
 from fastapi import HTTPException
 
+from .credential_store import CredentialStore
 from .https_client import HTTPSClient
 
 # Configure logging
@@ -21,6 +22,11 @@ class TokenManager:
     _instance: Optional["TokenManager"] = None
     _singleton_lock = Lock()  # For thread-safe singleton implementation
 
+    # Background refresh tuning
+    REFRESH_LIFETIME_FRACTION: float = 0.25  # Margin never exceeds this share of the lifetime
+    REFRESH_MIN_BACKOFF: float = 5.0
+    REFRESH_MAX_BACKOFF: float = 300.0
+
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             with cls._singleton_lock:
@@ -28,14 +34,22 @@ class TokenManager:
                     cls._instance = super(TokenManager, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, use_mock: bool = False, url: str = "http://localhost:8001"):
+    def __init__(
+        self,
+        use_mock: bool = False,
+        url: str = "http://localhost:8001",
+        credential_cache_ttl: float = 43200.0,
+    ):
         if not hasattr(self, "_initialized"):
             self.token: Optional[str] = None
             self.token_expiration: Optional[float] = None  # Use float para timestamp
             self.state = "Authenticated" if self.token else "Unauthenticated"
-            self.token_lock: Optional[asyncio.Lock] = None
+            self.token_issued_at: Optional[float] = None
+            self._refresh_task: Optional[asyncio.Task] = None
+            self._auth_task: Optional[asyncio.Task] = None  # Shared by concurrent waiters
             self.use_mock = use_mock
             self._url = url
+            self._credential_cache_ttl = credential_cache_ttl
             self._state_file = "token_manager_state.json"  # Nome do arquivo de estado
             self._load_token_from_file()  # Tenta carregar o token do arquivo
             self._initialized = True  # Prevent re-initialization
@@ -101,6 +115,7 @@ class TokenManager:
         success = await self._perform_authentication()
         if success:
             self.state = "Authenticated"
+            self.token_issued_at = time.time()
             logger.info("[TokenManager] Authentication successful.")
             self._save_token_to_file()  # Salva o token após sucesso
             return self.token
@@ -123,6 +138,20 @@ class TokenManager:
         else:
             # Real authentication logic using HTTPSClient
             client = HTTPSClient()
+            store = CredentialStore()
+
+            # Fast path: cached matched credentials, last known good one first
+            cached_credentials = store.get_cached_credentials(self._credential_cache_ttl)
+            if cached_credentials:
+                logger.debug("Probing cached credentials.")
+                device_config = await self._probe_ranked_credentials(
+                    client, store, cached_credentials
+                )
+                if device_config:
+                    return self._apply_device_configuration(client, device_config)
+                logger.info("Cached credentials failed, matching them again.")
+                store.clear_matched_credentials()
+
             username = "info@xd.pt"
             password = "xd"
             username_app = "XDBR.105112"
@@ -132,7 +161,9 @@ class TokenManager:
 
             # Step 1: Authenticate
             logger.debug("Autenticando com HTTPSClient.")
-            success = client.authenticate(username, password, client_id, client_secret)
+            success = await client.authenticate(
+                username, password, client_id, client_secret
+            )
             if not success:
                 logger.error("Authentication failed in HTTPSClient.")
                 return False
@@ -141,100 +172,226 @@ class TokenManager:
 
             # Step 2: Match credentials
             logger.debug("Matching credentials.")
-            matched_credentials = client.match_credentials(username_app, password_app)
+            matched_credentials = await client.match_credentials(
+                username_app, password_app
+            )
             if not matched_credentials:
                 logger.error("Failed to match credentials.")
                 return False
 
             logger.info("Credentials matched successfully.")
+            store.store_matched_credentials(matched_credentials)
 
-            # Step 3: Try each credential until one works
-            device_config = client.try_all_credentials_until_success(
-                matched_credentials
+            # Step 3: Probe the credentials concurrently until one works
+            device_config = await self._probe_ranked_credentials(
+                client, store, matched_credentials
             )
             if device_config:
-                logger.info("Device configuration received.")
+                return self._apply_device_configuration(client, device_config)
+            logger.error("Failed to receive device configuration with all credentials.")
+            return False
 
-                # Use the access token from HTTPSClient
-                self.token = device_config["Token"]
+    async def _probe_ranked_credentials(self, client, store, credentials):
+        """
+        Probe the last known good credential alone, then the rest concurrently,
+        recording the outcome in the CredentialStore.
+        """
+        usable = sorted(client.usable_credentials(credentials), key=store.rank_key)
+        if not usable:
+            return None
+
+        rounds = [usable]
+        if str(usable[0].get("credentialId")) == store.last_good_credential_id:
+            rounds = [usable[:1], usable[1:]]
+
+        for candidates in rounds:
+            if not candidates:
+                continue
+            started_at = time.monotonic()
+            device_config = await client.probe_credentials(
+                candidates, key=store.rank_key
+            )
+            if device_config:
+                store.record_success(
+                    client.selected_credential_id, time.monotonic() - started_at
+                )
+                return device_config
+            store.record_failures([cred.get("credentialId") for cred in candidates])
+        return None
 
-                # Set the token expiration time based on actual token lifetime
-                if hasattr(client, "token_expiration") and client.token_expiration:
-                    self.token_expiration = client.token_expiration
-                else:
-                    # Default to 1 day if no expiration time is provided
-                    self.token_expiration = time.time() + 86400  # 1 day
+    def _apply_device_configuration(self, client, device_config) -> bool:
+        """Adopt the token from a DeviceConfiguration."""
+        logger.info("Device configuration received.")
 
-                logger.debug(
-                    f"Token set to '{self.token}' with expiration at {datetime.fromtimestamp(self.token_expiration)}."
-                )
-                return True
-            else:
-                logger.error(
-                    "Failed to receive device configuration with all credentials."
-                )
-                return False
+        # Use the access token from HTTPSClient
+        self.token = device_config["Token"]
+
+        # Set the token expiration time based on actual token lifetime
+        if hasattr(client, "token_expiration") and client.token_expiration:
+            self.token_expiration = client.token_expiration
+        else:
+            # Default to 1 day if no expiration time is provided
+            self.token_expiration = time.time() + 86400  # 1 day
+
+        logger.debug(
+            f"Token set to '{self.token}' with expiration at {datetime.fromtimestamp(self.token_expiration)}."
+        )
+        return True
 
     def is_token_expired(self):
-        # Check if the token is expired
-        logger.info(f"Token expiration timestamp: {self.token_expiration}")
+        """Return whether the token is missing or past its expiration (no side effects)."""
         if not self.token_expiration:
-            logger.warning("Token expiration not set. Considered expired.")
             return True
-        is_expired = time.time() >= self.token_expiration
-        if is_expired:
-            logger.warning("Token has expired.")
-            self.token = None
-            self.token_expiration = None
-            self._delete_token_file()  # Remove o arquivo se o token expirou
-        else:
-            time_left = self.token_expiration - time.time()
-            logger.debug(f"Token is valid for {time_left:.2f} more seconds.")
-        return is_expired
+        return time.time() >= self.token_expiration
+
+    def _has_valid_token(self) -> bool:
+        """Return whether the in-memory token can be used as is."""
+        return (
+            self.state == "Authenticated"
+            and self.token is not None
+            and not self.is_token_expired()
+        )
+
+    def _discard_expired_token(self):
+        """Drop an expired token from memory and disk before re-authenticating."""
+        if self.token is None or not self.is_token_expired():
+            return
+        logger.warning("Token has expired.")
+        self.token = None
+        self.token_expiration = None
+        self._delete_token_file()  # Remove o arquivo se o token expirou
+
+    def _seconds_until_refresh(self, margin: float, jitter: float) -> float:
+        """Return how long to wait before renewing the current token."""
+        if not self.token or not self.token_expiration:
+            return 0.0
+        now = time.time()
+        remaining = self.token_expiration - now
+        lifetime = (
+            self.token_expiration - self.token_issued_at
+            if self.token_issued_at
+            else remaining
+        )
+        effective_margin = min(margin, lifetime * self.REFRESH_LIFETIME_FRACTION)
+        effective_jitter = random.uniform(0, min(jitter, effective_margin))
+        return max(0.0, remaining - effective_margin - effective_jitter)
+
+    async def refresh_token(self) -> bool:
+        """
+        Renew the token while the current one keeps serving requests.
+
+        The in-memory token is only replaced once the new one is obtained, so
+        callers of `get_token` never wait on the OAuth/credential round-trips.
+        """
+        if self._pending_auth_task() is not None:
+            logger.debug("[TokenManager] Authentication in progress, skipping refresh.")
+            return False
+
+        self._auth_task = asyncio.get_running_loop().create_task(self._renew_token())
+        return await asyncio.shield(self._auth_task)
+
+    async def _renew_token(self) -> bool:
+        """Authenticate again without invalidating the current token first."""
+        logger.info("[TokenManager] Refreshing token in the background.")
+        success = await self._perform_authentication()
+        if not success:
+            logger.error("[TokenManager] Background token refresh failed.")
+            return False
+
+        self.state = "Authenticated"
+        self.token_issued_at = time.time()
+        self._save_token_to_file()
+        logger.info(
+            f"[TokenManager] Token refreshed, expires at {datetime.fromtimestamp(self.token_expiration)}."
+        )
+        return True
+
+    async def _refresh_loop(self, margin: float, jitter: float):
+        """Renew the token ahead of expiration, backing off after failures."""
+        backoff = self.REFRESH_MIN_BACKOFF
+        while True:
+            delay = self._seconds_until_refresh(margin, jitter)
+            logger.debug(f"[TokenManager] Next token refresh in {delay:.1f} seconds.")
+            await asyncio.sleep(delay)
+            try:
+                refreshed = await self.refresh_token()
+            except Exception as e:
+                logger.error(f"[TokenManager] Unexpected error refreshing token: {e}")
+                refreshed = False
+
+            if refreshed:
+                backoff = self.REFRESH_MIN_BACKOFF
+                continue
+
+            await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+            backoff = min(backoff * 2, self.REFRESH_MAX_BACKOFF)
+
+    def start_background_refresh(self, margin: float, jitter: float = 0.0):
+        """Start the background refresher on the running event loop (idempotent)."""
+        if margin <= 0:
+            logger.info("[TokenManager] Background token refresh disabled.")
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(
+            self._refresh_loop(margin, jitter)
+        )
+        logger.info(
+            f"[TokenManager] Background token refresh started (margin {margin}s, jitter {jitter}s)."
+        )
+
+    async def stop_background_refresh(self):
+        """Cancel the background refresher, if running."""
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+    def _pending_auth_task(self) -> Optional[asyncio.Task]:
+        """
+        The authentication still running on this event loop, if any.
+
+        A task left by another loop (e.g. the asyncio.run() of a client built
+        in a worker thread) cannot be awaited here, so it is ignored.
+        """
+        task = self._auth_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
 
     async def get_token(self):
-        # Lock access to the token to ensure a single authentication
-        logger.info(f"State: {self.state}")
-        if self.token_lock is None:
-            self.token_lock = asyncio.Lock()
-        async with self.token_lock:
-            logger.debug("Entering get_token - Current state: %s", self.state)
-
-            # If already authenticated and token is valid, return the token directly
-            if self.state == "Authenticated" and not self.is_token_expired():
-                logger.debug("Token is valid and authenticated, returning token.")
+        """
+        Return a valid token, authenticating only when there is none.
+
+        Valid tokens are returned without locking, logging or file I/O. When
+        (re-)authentication is needed, every concurrent caller awaits the same
+        task, so only one authentication runs at a time.
+        """
+        for _ in range(2):
+            if self._has_valid_token():
                 return self.token
 
-            # If authentication is already in progress, wait until it completes
-            if self.state == "Authenticating":
+            task = self._pending_auth_task()
+            if task is None:
+                logger.debug("Starting new authentication process.")
+                self._discard_expired_token()
+                task = asyncio.get_running_loop().create_task(self.authenticate())
+                self._auth_task = task
+            else:
                 logger.debug(
                     "Authentication already in progress, waiting for it to complete."
                 )
-                while self.state == "Authenticating":
-                    await asyncio.sleep(0.1)  # Briefly wait before checking again
-                # After waiting, check if the state is now authenticated
-                if self.state == "Authenticated" and not self.is_token_expired():
-                    logger.debug(
-                        "Authentication completed by another process, returning token."
-                    )
-                    return self.token
-                else:
-                    # If authentication failed, raise an error
-                    logger.error("Authentication failed during wait.")
-                    raise HTTPException(
-                        status_code=401, detail="Authentication failed."
-                    )
-
-            # Otherwise, start a new authentication
-            logger.debug("Starting new authentication process.")
-            self.state = "Authenticating"
-            try:
-                await self.authenticate()
-                logger.debug("Authentication process completed, returning token.")
-                return self.token
-            except HTTPException as e:
-                logger.error("Error during authentication.")
-                raise e
+            # Raises the same HTTPException for every waiter if authentication fails
+            await asyncio.shield(task)
+
+        if self._has_valid_token():
+            return self.token
+        logger.error("Authentication failed during wait.")
+        raise HTTPException(status_code=401, detail="Authentication failed.")
 
     async def is_authenticated(self):
         self.state = "Authenticated" if self.token and not self.is_token_expired() else "Unauthenticated"
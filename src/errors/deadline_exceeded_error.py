@@ -0,0 +1,13 @@
+from fastapi import HTTPException
+
+
+class DeadlineExceededError(HTTPException):
+    """
+    The request ran out of time before the PoS answered.
+
+    Raised when the per-request deadline (X-Request-Timeout or the route
+    default) expires; the PoS connection involved is closed, never reused.
+    """
+
+    def __init__(self, detail: str = "Request deadline exceeded."):
+        super().__init__(status_code=504, detail=detail)
@@ -0,0 +1,14 @@
+from fastapi import HTTPException
+
+
+class NotModifiedError(HTTPException):
+    """
+    The client's cached copy (If-None-Match) is still current.
+
+    Answered as a bodiless `304 Not Modified` carrying the same ETag.
+    """
+
+    def __init__(self, etag: str):
+        super().__init__(
+            status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"}
+        )
@@ -0,0 +1,24 @@
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+class PosUnavailableError(HTTPException):
+    """
+    The XD server cannot be reached (transport failure or open circuit).
+
+    Kept apart from authentication failures: it never invalidates the token.
+    `transient` is False when retrying right away is pointless (circuit open).
+    """
+
+    def __init__(
+        self,
+        detail: str,
+        retry_after: Optional[float] = None,
+        transient: bool = True,
+    ):
+        self.transient = transient
+        headers = None
+        if retry_after is not None:
+            headers = {"Retry-After": str(max(1, int(retry_after + 0.999)))}
+        super().__init__(status_code=503, detail=detail, headers=headers)
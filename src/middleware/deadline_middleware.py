@@ -0,0 +1,73 @@
+import logging
+from typing import Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.utils.deadline import reset_deadline, set_deadline
+from src.utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineMiddleware:
+    """
+    Give every HTTP request a deadline that the PoS layers honour.
+
+    The client may ask for a budget (in seconds) with the `X-Request-Timeout`
+    header; otherwise the route default applies. Written as a plain ASGI
+    middleware so the deadline is set in the same context the endpoint runs in.
+    """
+
+    HEADER = b"x-request-timeout"
+
+    # Path suffix -> default deadline, for routes slower than a PoS round-trip
+    ROUTE_TIMEOUTS: Tuple[Tuple[str, float], ...] = (
+        ("/message/", 30.0),  # Groq call
+        ("/checkout/", 30.0),  # Groq call + prebill
+        ("/tables/batch/", 60.0),
+        ("/load/products/", 30.0),
+        ("/diagnostics/pos/discover", 60.0),  # Subnet scan
+    )
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            timeout = self._timeout_for(scope)
+        except ValueError as e:
+            response = JSONResponse(status_code=400, content={"detail": str(e)})
+            await response(scope, receive, send)
+            return
+
+        token = set_deadline(timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
+
+    def _timeout_for(self, scope: Scope) -> Optional[float]:
+        """Return the requested or default deadline for this request, in seconds."""
+        settings = get_settings()
+        for name, value in scope.get("headers", []):
+            if name == self.HEADER:
+                try:
+                    timeout = float(value.decode("latin-1"))
+                except ValueError:
+                    raise ValueError("X-Request-Timeout must be a number of seconds.")
+                if timeout <= 0:
+                    raise ValueError("X-Request-Timeout must be positive.")
+                if settings.request_timeout_max > 0:
+                    timeout = min(timeout, settings.request_timeout_max)
+                return timeout
+
+        path = scope.get("path", "")
+        for suffix, timeout in self.ROUTE_TIMEOUTS:
+            if path.endswith(suffix):
+                return timeout
+        return settings.request_timeout_default or None
@@ -7,28 +7,40 @@ from starlette.responses import JSONResponse
 class TimingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         start_time = time.time()
-        
+
         try:
             # Process the request
             response = await call_next(request)
         except Exception as e:
             # Optionally handle exceptions here
             raise e
-        
+
         process_time = time.time() - start_time
-        
+
         # Check if the response is JSON
         if response.headers.get("Content-Type", "").startswith("application/json"):
             # Read the original response body
-            body = [section async for section in response.body_iterator]
-            body_str = b"".join(body).decode()
-            data = json.loads(body_str) if body_str else {}
-            
-            # Add the processing time
-            data["response_time"] = process_time
-            
-            # Create a new JSON response with the updated data
-            new_response = JSONResponse(content=data, status_code=response.status_code)
+            body = b"".join([section async for section in response.body_iterator])
+            stripped = body.strip() or b"{}"
+            timing = json.dumps(process_time).encode()
+
+            if not stripped.startswith(b"{"):
+                # Not an object: nowhere to put the processing time
+                new_response = Response(content=body, status_code=response.status_code)
+            elif b'"response_time"' in body:
+                # The body already has a response_time key: overwrite it
+                data = json.loads(body)
+                data["response_time"] = process_time
+                new_response = JSONResponse(content=data, status_code=response.status_code)
+            else:
+                # Splice the processing time in before the closing brace, so
+                # pre-rendered bodies are not parsed and serialized again
+                separator = b"," if stripped[1:-1].strip() else b""
+                new_response = Response(
+                    content=stripped[:-1] + separator + b'"response_time":' + timing + b"}",
+                    status_code=response.status_code,
+                )
+
             for header, value in response.headers.items():
                 if header.lower() == "content-length":
                     continue
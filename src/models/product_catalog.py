@@ -0,0 +1,72 @@
+import sys
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from .entity_models import Product
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+class CatalogProduct:
+    """Read-only product record kept for the process lifetime (no per-instance dict)."""
+
+    __slots__ = ("id", "name", "parentId", "visible")
+
+    def __init__(
+        self,
+        id: Optional[int],
+        name: Optional[str],
+        parentId: Optional[int] = None,
+        visible: Optional[bool] = None,
+    ):
+        self.id = id
+        self.name = name
+        self.parentId = parentId
+        self.visible = visible
+
+    def __repr__(self) -> str:
+        return f"CatalogProduct(id={self.id!r}, name={self.name!r})"
+
+
+class ProductCatalog:
+    """
+    Product cache keyed by ID.
+
+    Built from validated `Product` models, which are then dropped: each entry
+    is a slotted record with interned names, which matters on the Raspberry
+    Pi where the catalog (up to 5000 items) stays resident. Lookups accept
+    the ID as int or as the string found in board items.
+    """
+
+    __slots__ = ("_by_id",)
+
+    def __init__(self, products: Iterable[Product] = ()):
+        self._by_id: Dict[int, CatalogProduct] = {}
+        for product in products:
+            if product.id is None:
+                continue
+            self._by_id[product.id] = CatalogProduct(
+                product.id,
+                _intern(product.name),
+                product.parentId,
+                product.visible,
+            )
+
+    def get(self, product_id: Union[int, str, None]) -> Optional[CatalogProduct]:
+        try:
+            return self._by_id.get(int(product_id))
+        except (TypeError, ValueError):
+            return None
+
+    def values(self) -> Iterable[CatalogProduct]:
+        return self._by_id.values()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._by_id)
+
+    def __contains__(self, product_id: object) -> bool:
+        return self.get(product_id) is not None  # type: ignore[arg-type]
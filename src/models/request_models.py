@@ -1,4 +1,6 @@
-from pydantic import BaseModel    
+from typing import List, Literal, Optional
+
+from pydantic import AnyHttpUrl, BaseModel, Field
 
 # Define your BoardRequest model
 class BoardRequest(BaseModel):
@@ -12,4 +14,21 @@ class AuthenticationRequest(BaseModel):
     client_secret: str = ""  # Default to an empty string like in your Java code
 
 class MessageRequest(BaseModel):
-    table_id: int
\ No newline at end of file
+    table_id: int
+
+# Define the batch prebill/close models
+BATCH_MAX_ACTIONS = 100  # One request cannot queue more POSTQUEUE messages than this
+
+class TableAction(BaseModel):
+    table_id: int
+    action: Literal["prebill", "close"]
+
+class BatchTableActionsRequest(BaseModel):
+    actions: List[TableAction] = Field(min_length=1, max_length=BATCH_MAX_ACTIONS)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+# Define the asynchronous job model
+class JobRequest(BaseModel):
+    table_id: int
+    action: Literal["prebill", "close"]
+    callback_url: Optional[AnyHttpUrl] = None
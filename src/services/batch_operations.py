@@ -0,0 +1,100 @@
+"""Batch execution of prebill/close POSTQUEUE actions."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+from fastapi import HTTPException
+
+from src.models.request_models import TableAction
+
+if TYPE_CHECKING:  # pragma: no cover - import used for typing only
+    from src.clients.restaurant_client import RestaurantClient
+
+logger = logging.getLogger(__name__)
+
+
+def _group_by_table(actions: Sequence[TableAction]) -> Dict[int, List[int]]:
+    """Map each table ID to the indexes of its actions, keeping request order."""
+
+    groups: Dict[int, List[int]] = {}
+    for index, action in enumerate(actions):
+        groups.setdefault(action.table_id, []).append(index)
+    return groups
+
+
+async def _run_action(client: "RestaurantClient", action: TableAction) -> str:
+    """Dispatch a single action to the matching RestaurantClient method."""
+
+    if action.action == "prebill":
+        return await client.prebill(action.table_id)
+    return await client.close_table(action.table_id)
+
+
+async def run_table_actions(
+    client: "RestaurantClient",
+    actions: Sequence[TableAction],
+    *,
+    max_concurrency: int,
+) -> Dict[str, Any]:
+    """
+    Execute prebill/close actions and return one outcome per action.
+
+    Actions targeting the same table run sequentially in request order, so a
+    prebill followed by a close never reaches the PoS reversed. Different tables
+    run in parallel, bounded by `max_concurrency` POSTQUEUE messages in flight
+    (each one on its own PoS connection). A failing action does not stop the
+    remaining ones.
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results: List[Dict[str, Any]] = [{} for _ in actions]
+
+    async def run_table_queue(indexes: List[int]) -> None:
+        for index in indexes:
+            action = actions[index]
+            outcome: Dict[str, Any] = {
+                "index": index,
+                "table_id": action.table_id,
+                "action": action.action,
+            }
+            started_at = time.perf_counter()
+            try:
+                async with semaphore:
+                    response = await _run_action(client, action)
+                outcome.update(status="success", response=response)
+            except HTTPException as exc:
+                logger.error(
+                    f"Batch {action.action} failed for table {action.table_id}: {exc.detail}"
+                )
+                outcome.update(
+                    status="error",
+                    error={"status_code": exc.status_code, "detail": exc.detail},
+                )
+            except Exception as exc:
+                logger.error(
+                    f"Batch {action.action} failed for table {action.table_id}: {exc}"
+                )
+                outcome.update(
+                    status="error",
+                    error={"status_code": 500, "detail": str(exc)},
+                )
+            outcome["elapsed"] = time.perf_counter() - started_at
+            results[index] = outcome
+
+    await asyncio.gather(
+        *(run_table_queue(indexes) for indexes in _group_by_table(actions).values())
+    )
+
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    return {
+        "results": results,
+        "summary": {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+        },
+    }
@@ -0,0 +1,121 @@
+"""Bill message and single-call checkout helpers."""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from fastapi import HTTPException
+
+from src.services.table_cache import store_table_content
+
+if TYPE_CHECKING:  # pragma: no cover - import used for typing only
+    from src.clients.restaurant_client import RestaurantClient
+    from src.order_processor.order_chain import OrderProcessorChain
+
+logger = logging.getLogger(__name__)
+
+
+def format_table_order(table_order: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Render the board lines as text for the LLM chain plus their structured form."""
+
+    formatted_order = ""
+    processed_table_items = []
+    for item in table_order.get("content", []):
+        product_name = item.get("itemName", "Not found")
+        quantity = item.get("quantity", 1)
+        price = item.get("price", 0.0)
+        total = item.get("total", 0.0)
+        # Format the line
+        line = f"{product_name} - {quantity} X R$ {price:.2f} = R$ {total:.2f}\n"
+        formatted_order += line
+        processed_table_items.append(
+            {
+                "product_name": product_name,
+                "quantity": quantity,
+                "price": price,
+                "total": total,
+            }
+        )
+    return formatted_order, processed_table_items
+
+
+async def build_table_message(
+    order_processor: "OrderProcessorChain",
+    table_id: int,
+    table_order: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Generate the WhatsApp message for an already fetched board."""
+
+    if not table_order.get("content"):
+        raise HTTPException(status_code=404, detail="Table content not found.")
+
+    # Create the file name based on the table_id
+    file_name = f"comanda_{table_id}.txt"
+    file_path = os.path.join(os.getcwd(), file_name)
+
+    formatted_order, processed_table_items = format_table_order(table_order)
+
+    logger.debug("Formatted order for table %s: %s", table_id, formatted_order)
+    logger.debug(f"Formatted order for table {table_id}: {formatted_order}")
+    order = await order_processor.main(formatted_order, file_path)
+    order["details"]["orders"] = processed_table_items
+    return order
+
+
+async def run_checkout(
+    client: "RestaurantClient",
+    order_processor: "OrderProcessorChain",
+    table_id: int,
+) -> Dict[str, Any]:
+    """
+    Read the board once, then build the message and send the prebill from it.
+
+    The prebill is only sent once the message is built: a message failure
+    leaves the PoS untouched, so retrying the checkout never prebills twice.
+    """
+
+    # Surface Groq configuration errors before touching the PoS
+    order_processor.initialize_config("config.ini")
+
+    timings: Dict[str, float] = {}
+    started_at = time.perf_counter()
+
+    table_order = await client.fetch_table_content(table_id)
+    store_table_content(table_id, table_order)
+    timings["board"] = time.perf_counter() - started_at
+
+    if not table_order.get("content"):
+        raise HTTPException(status_code=404, detail="Table content not found.")
+
+    async def timed(stage: str, coro):
+        stage_started_at = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[stage] = time.perf_counter() - stage_started_at
+
+    try:
+        message = await timed(
+            "message", build_table_message(order_processor, table_id, table_order)
+        )
+    except Exception as e:
+        logger.error(f"Checkout message failed for table {table_id}: {e}")
+        raise
+    try:
+        prebill = await timed(
+            "prebill", client.prebill(table_id, table_content=table_order)
+        )
+    except Exception as e:
+        logger.error(f"Checkout prebill failed for table {table_id}: {e}")
+        raise
+
+    timings["total"] = time.perf_counter() - started_at
+    return {
+        "table": table_order,
+        "message": message,
+        "prebill": {"status": "Payment status set successfully", "response": prebill},
+        "timings": timings,
+    }
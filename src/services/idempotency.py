@@ -0,0 +1,109 @@
+"""Idempotency-Key handling for the PoS write endpoints (prebill, close)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Fixed namespace so a key always maps to the same POSTQUEUE guid, across restarts
+_GUID_NAMESPACE = uuid.UUID("5b0f6f1e-6d3a-4f0e-9c51-3f1d2a7e8b40")
+MAX_KEY_LENGTH = 255
+
+
+@dataclass
+class IdempotencyRecord:
+    """Outcome (or in-flight task) of the first request seen with a key."""
+
+    action: str
+    table_id: int
+    guid: str
+    created_at: float
+    task: Optional["asyncio.Task[Any]"] = None
+    result: Any = None
+
+
+_RECORDS: Dict[str, IdempotencyRecord] = {}
+
+
+def guid_for(key: str, action: str, table_id: int) -> str:
+    """Derive the stable POSTQUEUE guid for an idempotency key."""
+
+    return str(uuid.uuid5(_GUID_NAMESPACE, f"{action}:{table_id}:{key}"))
+
+
+def _prune(ttl: float) -> None:
+    """Forget completed keys older than `ttl` seconds."""
+
+    cutoff = time.time() - ttl
+    for key in [k for k, r in _RECORDS.items() if r.task is None and r.created_at < cutoff]:
+        del _RECORDS[key]
+
+
+async def run_idempotent(
+    key: Optional[str],
+    action: str,
+    table_id: int,
+    operation: Callable[[Optional[str]], Awaitable[Any]],
+) -> Tuple[Any, bool]:
+    """
+    Run `operation(guid)` at most once per idempotency key.
+
+    Returns the result and whether it was replayed. A repeated key gets the
+    cached result, or joins the request still in flight. Failures are not
+    cached: retrying with the same key sends the same guid again, which the
+    XD server applies only once. Without a key the operation runs as usual
+    with a fresh guid.
+    """
+
+    if key is None:
+        return await operation(None), False
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters.",
+        )
+
+    _prune(get_settings().idempotency_ttl)
+    record = _RECORDS.get(key)
+    if record is not None and (record.action, record.table_id) != (action, table_id):
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request.",
+        )
+    if record is not None and record.task is None:
+        logger.info(f"Replaying {action} for table {table_id} (key {key}).")
+        return record.result, True
+
+    replayed = record is not None
+    if record is None:
+        guid = guid_for(key, action, table_id)
+        record = IdempotencyRecord(
+            action=action, table_id=table_id, guid=guid, created_at=time.time()
+        )
+        # A task, so the write completes even if the first caller disconnects
+        record.task = asyncio.get_running_loop().create_task(operation(guid))
+        record.task.add_done_callback(lambda task: _settle(key, record, task))
+        _RECORDS[key] = record
+
+    return await asyncio.shield(record.task), replayed
+
+
+def _settle(key: str, record: IdempotencyRecord, task: "asyncio.Task[Any]") -> None:
+    """Keep a successful result; drop the key after a failure so it can be retried."""
+
+    if task.cancelled() or task.exception() is not None:
+        if _RECORDS.get(key) is record:
+            del _RECORDS[key]
+        return
+    record.result = task.result()
+    record.task = None
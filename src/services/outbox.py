@@ -0,0 +1,423 @@
+"""Durable outbox for prebill/close POSTQUEUE actions."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.services.idempotency import guid_for
+from src.services.webhooks import WebhookDispatcher, create_schema, insert_event
+from src.utils.deadline import deadline_scope
+from src.utils.settings import get_settings
+
+if TYPE_CHECKING:  # pragma: no cover - import used for typing only
+    from src.clients.restaurant_client import RestaurantClient
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+ACTIONS = ("prebill", "close")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    table_id INTEGER NOT NULL,
+    guid TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    callback_url TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id);
+"""
+
+_COLUMNS = (
+    "id, action, table_id, guid, idempotency_key, status, attempts, "
+    "next_attempt_at, last_error, result, callback_url, created_at, updated_at"
+)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """PoS unavailable, deadline, auth or unexpected errors are worth retrying."""
+
+    if isinstance(exc, HTTPException):
+        return exc.status_code in (401, 408, 429) or exc.status_code >= 500
+    return True
+
+
+def job_view(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Public shape of an outbox entry, as returned by the jobs API and callbacks."""
+
+    return {
+        "job_id": entry["id"],
+        "action": entry["action"],
+        "table_id": entry["table_id"],
+        "status": entry["status"],
+        "attempts": entry["attempts"],
+        "result": entry["result"],
+        "error": entry["last_error"],
+        "created_at": entry["created_at"],
+        "updated_at": entry["updated_at"],
+    }
+
+
+class PosOutbox:
+    """
+    Append-only log of POSTQUEUE actions, kept in SQLite (WAL mode).
+
+    An action is committed to disk before the HTTP handler answers, then a
+    background worker sends it with the guid stored alongside, so a replay
+    after a crash or a retry after a timeout is applied once by the XD server.
+    Entries of a table are sent strictly in order: a prebill that keeps
+    failing holds back the close queued after it. Transient failures are
+    retried with exponential backoff; a 4xx answer (other than 401) or too many
+    attempts marks the entry failed, together with the entries of that table
+    queued behind it, which are never sent.
+    """
+
+    POLL_INTERVAL: float = 1.0  # Seconds between scans when nothing wakes the worker
+    RETRY_JITTER: float = 0.2  # Fraction of the backoff added at random
+
+    _instance: Optional["PosOutbox"] = None
+    _singleton_lock = threading.Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(PosOutbox, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.path: str = settings.outbox_path
+            self.max_attempts: int = settings.outbox_max_attempts
+            self.retry_backoff: float = settings.outbox_retry_backoff
+            self.retry_max_backoff: float = settings.outbox_retry_max_backoff
+            self.retention: float = settings.outbox_retention
+            self.attempt_timeout: float = settings.request_timeout_default or 30.0
+            self._db_lock = threading.Lock()  # One connection shared by worker threads
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.executescript(_SCHEMA)
+            # Job callbacks are committed with the status change they report
+            create_schema(self._connection)
+            self._wakeup: Optional[asyncio.Event] = None
+            self._worker: Optional[asyncio.Task] = None
+            self._client: Optional["RestaurantClient"] = None
+            self._client_factory: Optional[Callable[[], "RestaurantClient"]] = None
+            self._initialized = True  # Prevent re-initialization
+
+    # -- storage -----------------------------------------------------------
+
+    def _execute(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            cursor = self._connection.execute(query, params)
+            return [self._row_to_entry(row) for row in cursor.fetchall()]
+
+    async def _run(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Run a statement off the event loop (FULL sync means an fsync per commit)."""
+        return await asyncio.to_thread(self._execute, query, params)
+
+    def _settle(self, query: str, params: tuple) -> Dict[str, Any]:
+        """
+        Apply a final status update and, in the same transaction, queue the
+        entry's callback, so a crash cannot keep one without the other.
+        """
+        with self._db_lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            entry = self._row_to_entry(
+                self._connection.execute(f"{query} RETURNING {_COLUMNS}", params).fetchone()
+            )
+            if entry["callback_url"]:
+                insert_event(
+                    self._connection,
+                    entry["callback_url"],
+                    {"type": f"job.{entry['status']}", "job": job_view(entry)},
+                    ref=f"job:{entry['id']}",
+                    now=entry["updated_at"],
+                )
+        return entry
+
+    async def _finish(self, query: str, params: tuple):
+        entry = await asyncio.to_thread(self._settle, query, params)
+        if entry["callback_url"]:
+            WebhookDispatcher().wake()
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        if entry.get("result") is not None:
+            entry["result"] = json.loads(entry["result"])
+        return entry
+
+    async def enqueue(
+        self,
+        action: str,
+        table_id: int,
+        idempotency_key: Optional[str] = None,
+        callback_url: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Durably record an action and wake the worker. An idempotency key that
+        is already in the outbox returns the existing entry instead. With a
+        `callback_url`, the outcome is posted there once the entry settles.
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown outbox action: {action}")
+        if idempotency_key is not None:
+            existing = await self._run(
+                f"SELECT {_COLUMNS} FROM outbox WHERE idempotency_key = ?",
+                (idempotency_key,),
+            )
+            if existing:
+                entry = existing[0]
+                if (entry["action"], entry["table_id"]) != (action, table_id):
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used for a different request.",
+                    )
+                return entry
+
+        now = time.time()
+        guid = (
+            guid_for(idempotency_key, action, table_id)
+            if idempotency_key is not None
+            else str(uuid.uuid4())
+        )
+        entry = (
+            await self._run(
+                f"INSERT INTO outbox (action, table_id, guid, idempotency_key, status, "
+                f"next_attempt_at, callback_url, created_at, updated_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING {_COLUMNS}",
+                (
+                    action,
+                    table_id,
+                    guid,
+                    idempotency_key,
+                    PENDING,
+                    now,
+                    callback_url,
+                    now,
+                    now,
+                ),
+            )
+        )[0]
+        logger.info(f"Queued {action} for table {table_id} (outbox #{entry['id']}).")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return entry
+
+    async def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Return one outbox entry, or None."""
+        rows = await self._run(f"SELECT {_COLUMNS} FROM outbox WHERE id = ?", (entry_id,))
+        return rows[0] if rows else None
+
+    async def list_entries(
+        self, status: Optional[str] = None, limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Most recent entries first, optionally filtered by status."""
+        if status is None:
+            return await self._run(
+                f"SELECT {_COLUMNS} FROM outbox ORDER BY id DESC LIMIT ?", (limit,)
+            )
+        return await self._run(
+            f"SELECT {_COLUMNS} FROM outbox WHERE status = ? ORDER BY id DESC LIMIT ?",
+            (status, limit),
+        )
+
+    async def counts(self) -> Dict[str, Any]:
+        """Entries per status plus the age of the oldest pending one."""
+        rows = await self._run(
+            "SELECT status, COUNT(*) AS count, MIN(created_at) AS oldest "
+            "FROM outbox GROUP BY status"
+        )
+        counts: Dict[str, Any] = {PENDING: 0, DONE: 0, FAILED: 0}
+        oldest_pending = None
+        for row in rows:
+            counts[row["status"]] = row["count"]
+            if row["status"] == PENDING:
+                oldest_pending = row["oldest"]
+        counts["oldest_pending_age"] = (
+            time.time() - oldest_pending if oldest_pending is not None else None
+        )
+        return counts
+
+    # -- worker ------------------------------------------------------------
+
+    def start(self, client_factory: Callable[[], "RestaurantClient"]):
+        """Start the drain worker; pending entries left by a previous run are replayed."""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._client_factory = client_factory
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._drain_loop())
+
+    async def stop(self):
+        """Stop the worker; entries not yet sent stay pending on disk."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _drain_loop(self):
+        last_prune = 0.0
+        while True:
+            try:
+                next_due = await self.drain()
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    await self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox drain failed: {e}", exc_info=True)
+                next_due = None
+
+            timeout = self.POLL_INTERVAL
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self) -> Optional[float]:
+        """
+        Send every due pending entry once; tables run concurrently, entries of
+        one table in order. Returns when the next pending entry is due.
+        """
+        pending = await self._run(
+            f"SELECT {_COLUMNS} FROM outbox WHERE status = ? ORDER BY id", (PENDING,)
+        )
+        if not pending:
+            return None
+
+        queues: Dict[int, List[Dict[str, Any]]] = {}
+        for entry in pending:
+            queues.setdefault(entry["table_id"], []).append(entry)
+
+        client = await self._get_client()
+        next_due: List[float] = []
+
+        async def run_table_queue(entries: List[Dict[str, Any]]):
+            for position, entry in enumerate(entries):
+                if entry["next_attempt_at"] > time.time():
+                    next_due.append(entry["next_attempt_at"])
+                    return
+                status, retry_at = await self._send(client, entry)
+                if status == FAILED:
+                    # A close must not reach the PoS after its prebill failed
+                    await self._fail_behind(entry, entries[position + 1 :])
+                    return
+                if retry_at is not None:
+                    # Later entries of this table wait until this one goes through
+                    next_due.append(retry_at)
+                    return
+
+        await asyncio.gather(*(run_table_queue(entries) for entries in queues.values()))
+        return min(next_due) if next_due else None
+
+    async def _get_client(self) -> "RestaurantClient":
+        if self._client is None:
+            # The real client loads its product cache with asyncio.run in __init__
+            self._client = await asyncio.to_thread(self._client_factory)
+        return self._client
+
+    async def _send(
+        self, client: "RestaurantClient", entry: Dict[str, Any]
+    ) -> Tuple[str, Optional[float]]:
+        """Send one entry and record the outcome; returns its status and retry time."""
+        attempts = entry["attempts"] + 1
+        try:
+            with deadline_scope(self.attempt_timeout):
+                if entry["action"] == "prebill":
+                    result = await client.prebill(entry["table_id"], guid=entry["guid"])
+                else:
+                    result = await client.close_table(entry["table_id"], guid=entry["guid"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            now = time.time()
+            if not _is_transient(e) or attempts >= self.max_attempts:
+                logger.error(f"Outbox #{entry['id']} failed for good: {error}")
+                await self._finish(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (FAILED, attempts, error, now, entry["id"]),
+                )
+                return FAILED, None
+            backoff = min(self.retry_max_backoff, self.retry_backoff * 2 ** (attempts - 1))
+            retry_at = now + backoff * (1 + random.uniform(0, self.RETRY_JITTER))
+            logger.warning(
+                f"Outbox #{entry['id']} attempt {attempts} failed ({error}); "
+                f"retrying in {retry_at - now:.1f}s."
+            )
+            await self._run(
+                "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ?, "
+                "updated_at = ? WHERE id = ?",
+                (attempts, error, retry_at, now, entry["id"]),
+            )
+            return PENDING, retry_at
+
+        await self._finish(
+            "UPDATE outbox SET status = ?, attempts = ?, result = ?, last_error = NULL, "
+            "updated_at = ? WHERE id = ?",
+            (DONE, attempts, json.dumps(result), time.time(), entry["id"]),
+        )
+        logger.info(f"Outbox #{entry['id']} acknowledged by the PoS.")
+        return DONE, None
+
+    async def _fail_behind(self, failed: Dict[str, Any], entries: List[Dict[str, Any]]):
+        """Fail the entries queued after `failed` for its table without sending them."""
+        error = f"Not sent: outbox #{failed['id']} for this table failed."
+        for entry in entries:
+            logger.error(f"Outbox #{entry['id']} dropped: {error}")
+            await self._finish(
+                "UPDATE outbox SET status = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), entry["id"]),
+            )
+
+    async def _prune(self):
+        """Drop acknowledged entries older than the retention period."""
+        await self._run(
+            "DELETE FROM outbox WHERE status = ? AND updated_at < ?",
+            (DONE, time.time() - self.retention),
+        )
+
+    async def status(self) -> Dict[str, Any]:
+        """Backlog figures for diagnostics."""
+        return {
+            "path": self.path,
+            "worker_running": self._worker is not None and not self._worker.done(),
+            "counts": await self.counts(),
+        }
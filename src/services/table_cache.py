@@ -1,28 +1,73 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import logging
 import math
 import time
-from dataclasses import dataclass
+import uuid
+from dataclasses import dataclass, replace
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
 
+from src.errors.deadline_exceeded_error import DeadlineExceededError
+from src.errors.not_modified_error import NotModifiedError
+from src.errors.pos_unavailable_error import PosUnavailableError
 from src.models.entity_models import Table
+from src.services.table_columns import TableColumns
+from src.utils.settings import get_settings
 
 if TYPE_CHECKING:  # pragma: no cover - import used for typing only
     from src.clients.restaurant_client import RestaurantClient
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+# Part of every snapshot ETag: versions restart at 1 with the process, so an
+# ETag from a previous run must not match the new snapshot with that number
+_BOOT_ID = uuid.uuid4().hex[:12]
+
+RENDER_CACHE_SIZE = 32  # Rendered bodies kept (version/page/size/filter/trace combinations)
+
+
+@dataclass(frozen=True)
 class TablesSnapshot:
-    """Simple in-memory cache for the latest tables payload."""
+    """
+    Immutable, versioned tables payload.
+
+    A refresh publishes a new object instead of mutating the current one, so
+    a reader keeps a consistent view for as long as it holds the reference.
+    The version only changes when the table list does; `etag` names the
+    version within this process, and `trace_etag` also the wire trace, so a
+    client never revalidates against an older version or a previous run.
+
+    Each table is serialized once, when its version is published
+    (`table_json`), and copied into NumPy columns (`columns`) for summaries,
+    filters, ID lookups and diffs; no `Table` model is kept, so nothing the
+    client mutates later can leak in. Response bodies are assembled from the
+    fragments and kept in a module-level cache keyed by the snapshot ETag, so
+    repeated reads skip pydantic entirely.
+    """
 
-    tables: List[Table]
+    version: int
+    etag: str
+    table_json: Tuple[bytes, ...]
+    columns: TableColumns
+    summary_json: bytes
     wire_trace: Optional[Dict[str, Any]]
     fetched_at: float
+    trace_etag: Optional[str] = None
+
+    def etag_for(self, include_wire_trace: bool) -> str:
+        """ETag of a body built from this snapshot, with or without the trace."""
+        if include_wire_trace and self.trace_etag is not None:
+            return self.trace_etag
+        return self.etag
 
 
-@dataclass
+@dataclass(frozen=True)
 class TableDetailSnapshot:
     """Cache entry for a specific table content response."""
 
@@ -30,36 +75,192 @@ class TableDetailSnapshot:
     table: Dict[str, Any]
     wire_trace: Optional[Dict[str, Any]]
     fetched_at: float
+    etag: str = ""
+
+    def __post_init__(self):
+        if not self.etag:
+            object.__setattr__(self, "etag", content_etag(self.table))
+
+    def etag_for(self, include_wire_trace: bool) -> str:
+        """ETag of the payload, which changes with the trace when it is included."""
+        if include_wire_trace and self.wire_trace is not None:
+            return content_etag([self.table, self.wire_trace])
+        return self.etag
+
+
+def _bytes_etag(data: bytes) -> str:
+    # Weak: bodies get response_time added by the timing middleware
+    return f'W/"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+
+def _version_etag(version: int, wire_trace: Optional[Dict[str, Any]] = None) -> str:
+    """Weak ETag for a snapshot version of this process (and its wire trace)."""
+
+    tag = f"{_BOOT_ID}-{version}"
+    if wire_trace is not None:
+        tag += "-" + hashlib.blake2b(_dump_json(wire_trace), digest_size=8).hexdigest()
+    return f'W/"{tag}"'
 
 
+def content_etag(value: Any) -> str:
+    """Weak ETag over the canonical JSON of `value`."""
+
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return _bytes_etag(canonical.encode())
+
+
+def _dump_json(value: Any) -> bytes:
+    """Serialize like FastAPI's JSONResponse (compact, UTF-8)."""
+
+    return json.dumps(
+        jsonable_encoder(value), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def _check_not_modified(etag: str, if_none_match: Optional[str]) -> None:
+    """Raise NotModifiedError when If-None-Match already has `etag`."""
+
+    if not if_none_match:
+        return
+    # Weak comparison (RFC 9110 13.1.2): the W/ prefix is ignored
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        raise NotModifiedError(etag)
+
+
+def _apply_etag(
+    response: Optional[Response], etag: str, if_none_match: Optional[str]
+) -> None:
+    """Tag the response; raise NotModifiedError when If-None-Match already has it."""
+
+    if response is None:
+        return
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    _check_not_modified(etag, if_none_match)
+
+
+# Copy-on-write: these are only ever rebound, never mutated in place, so
+# readers need no lock.
 _SNAPSHOT: Optional[TablesSnapshot] = None
+_SNAPSHOT_HISTORY: Dict[int, TablesSnapshot] = {}
 _TABLE_DETAILS: Dict[int, TableDetailSnapshot] = {}
+_RENDERED: Dict[Tuple[Any, ...], bytes] = {}  # Oldest first, at most RENDER_CACHE_SIZE
+_REFRESH: Optional[asyncio.Task] = None
 
 
-async def get_tables_snapshot(client: "RestaurantClient") -> TablesSnapshot:
+def publish_tables_snapshot(
+    tables: Sequence[Table], wire_trace: Optional[Dict[str, Any]] = None
+) -> TablesSnapshot:
     """
-    Return the cached tables snapshot, fetching it lazily on first access.
+    Make `tables` the current snapshot and return it.
 
-    The snapshot persists for the lifetime of the FastAPI process so repeated
-    pagination requests operate on a consistent dataset.
+    Unchanged content keeps its version (only the fetch time and, when given,
+    the wire trace are updated); otherwise the next version is published and
+    the oldest beyond `tables_snapshot_history` are forgotten.
     """
 
-    global _SNAPSHOT
-    if _SNAPSHOT is None:
-        payload = await client.fetch_tables_with_trace()
-        _SNAPSHOT = TablesSnapshot(
-            tables=payload["tables"],
-            wire_trace=payload.get("wire_trace"),
+    global _SNAPSHOT, _SNAPSHOT_HISTORY
+    current = _SNAPSHOT
+    table_json = tuple(table.model_dump_json().encode() for table in tables)
+    if current is not None and current.table_json == table_json:
+        snapshot = replace(
+            current,
+            wire_trace=wire_trace if wire_trace is not None else current.wire_trace,
+            fetched_at=time.time(),
+            trace_etag=(
+                _version_etag(current.version, wire_trace)
+                if wire_trace is not None
+                else current.trace_etag
+            ),
+        )
+    else:
+        columns = TableColumns.from_tables(tables)
+        version = current.version + 1 if current is not None else 1
+        snapshot = TablesSnapshot(
+            version=version,
+            etag=_version_etag(version),
+            table_json=table_json,
+            columns=columns,
+            summary_json=_dump_json(columns.summary()),
+            wire_trace=wire_trace,
             fetched_at=time.time(),
+            trace_etag=_version_etag(version, wire_trace) if wire_trace is not None else None,
         )
-    return _SNAPSHOT
+
+    keep = get_settings().tables_snapshot_history
+    history = {
+        version: old
+        for version, old in _SNAPSHOT_HISTORY.items()
+        if version > snapshot.version - keep
+    }
+    history[snapshot.version] = snapshot
+    _SNAPSHOT_HISTORY = history
+    _SNAPSHOT = snapshot
+    return snapshot
+
+
+async def _fetch_tables_snapshot(client: "RestaurantClient") -> TablesSnapshot:
+    payload = await client.fetch_tables_with_trace()
+    return publish_tables_snapshot(payload["tables"], payload.get("wire_trace"))
+
+
+async def get_tables_snapshot(
+    client: "RestaurantClient", *, require_wire_trace: bool = False
+) -> TablesSnapshot:
+    """
+    Return the current tables snapshot, fetching it when missing, older than
+    `tables_snapshot_max_age` (if set) or lacking a requested wire trace.
+
+    Concurrent readers share one fetch; when it fails because the PoS is down
+    or out of time, the previous snapshot is served.
+    """
+
+    global _REFRESH
+    snapshot = _SNAPSHOT
+    max_age = get_settings().tables_snapshot_max_age
+    if (
+        snapshot is not None
+        and not (require_wire_trace and snapshot.wire_trace is None)
+        and not (max_age > 0 and time.time() - snapshot.fetched_at > max_age)
+    ):
+        return snapshot
+
+    if _REFRESH is None or _REFRESH.done():
+        _REFRESH = asyncio.get_running_loop().create_task(
+            _fetch_tables_snapshot(client)
+        )
+    try:
+        return await asyncio.shield(_REFRESH)
+    except (PosUnavailableError, DeadlineExceededError) as exc:
+        if snapshot is None:
+            raise
+        logger.warning(f"{exc.detail} Serving tables snapshot v{snapshot.version}.")
+        return snapshot
+
+
+def get_pinned_tables_snapshot(version: int) -> TablesSnapshot:
+    """Return a snapshot by version; 410 once it has been evicted."""
+
+    snapshot = _SNAPSHOT_HISTORY.get(version)
+    if snapshot is not None:
+        return snapshot
+    current = _SNAPSHOT
+    if current is None or version > current.version:
+        raise HTTPException(status_code=404, detail="Unknown tables version.")
+    raise HTTPException(
+        status_code=410,
+        detail="Tables version expired, restart from the first page.",
+    )
 
 
 def reset_tables_snapshot() -> None:
-    """Clear the cached snapshot (mainly useful for tests or manual resets)."""
+    """Clear the cached snapshots (mainly useful for tests or manual resets)."""
 
-    global _SNAPSHOT
+    global _SNAPSHOT, _SNAPSHOT_HISTORY, _RENDERED
     _SNAPSHOT = None
+    _SNAPSHOT_HISTORY = {}
+    _RENDERED = {}
 
 
 def reset_table_detail_snapshot(table_id: Optional[int] = None) -> None:
@@ -71,46 +272,53 @@ def reset_table_detail_snapshot(table_id: Optional[int] = None) -> None:
     if table_id is None:
         _TABLE_DETAILS = {}
         return
-    _TABLE_DETAILS.pop(table_id, None)
-
+    _TABLE_DETAILS = {
+        key: value for key, value in _TABLE_DETAILS.items() if key != table_id
+    }
 
-def summarize_tables(tables: Sequence[Table]) -> Dict[str, int]:
-    """Calculate aggregate counts for the UI summary cards."""
 
-    return {
-        "total": len(tables),
-        "open": sum(1 for t in tables if t.status == 1),
-        "closing": sum(1 for t in tables if t.status == 2),
-        "free": sum(1 for t in tables if t.status == 0),
-    }
+def _store_table_detail(snapshot: TableDetailSnapshot) -> None:
+    global _TABLE_DETAILS
+    _TABLE_DETAILS = {**_TABLE_DETAILS, snapshot.table_id: snapshot}
 
 
-def paginate_tables(
-    tables: Sequence[Table],
-    page: Optional[int],
-    page_size: Optional[int],
-) -> Tuple[List[Table], Optional[Dict[str, Any]]]:
+def validate_pagination(page: Optional[int], page_size: Optional[int]) -> bool:
     """
-    Slice the tables list using 1-based `page` and positive `page_size`.
+    Reject incomplete or non-positive pagination parameters with a 400.
 
-    Returns the visible tables plus pagination metadata (or None when pagination
-    parameters are absent).
+    Returns whether pagination was requested.
     """
 
     if page is None and page_size is None:
-        return list(tables), None
+        return False
     if (page is None) != (page_size is None):
         raise HTTPException(
             status_code=400,
             detail="Both page and page_size must be provided to enable pagination.",
         )
-    assert page is not None and page_size is not None  # for type checkers
     if page <= 0 or page_size <= 0:
         raise HTTPException(
             status_code=400, detail="page and page_size must be positive integers."
         )
+    return True
+
+
+def pagination_meta(
+    total_items: int,
+    page: Optional[int],
+    page_size: Optional[int],
+) -> Optional[Dict[str, Any]]:
+    """
+    Validate 1-based `page` and positive `page_size` against `total_items`.
+
+    Returns the pagination metadata (or None when pagination parameters are
+    absent); `start_index`/`end_index` are 1-based and inclusive.
+    """
+
+    if not validate_pagination(page, page_size):
+        return None
+    assert page is not None and page_size is not None  # for type checkers
 
-    total_items = len(tables)
     total_pages = max(1, math.ceil(total_items / page_size)) if total_items else 1
     start_index = (page - 1) * page_size
 
@@ -118,9 +326,8 @@ def paginate_tables(
         raise HTTPException(status_code=404, detail="Requested page is out of range.")
 
     end_index = min(start_index + page_size, total_items)
-    visible_tables = list(tables[start_index:end_index])
 
-    pagination_meta = {
+    return {
         "page": page,
         "page_size": page_size,
         "total_items": total_items,
@@ -131,7 +338,67 @@ def paginate_tables(
         "end_index": end_index if total_items else 0,
     }
 
-    return visible_tables, pagination_meta
+
+def render_tables_body(
+    snapshot: TablesSnapshot,
+    page: Optional[int],
+    page_size: Optional[int],
+    include_wire_trace: bool = False,
+    statuses: Optional[Sequence[int]] = None,
+) -> bytes:
+    """
+    Return the JSON body for one page of `snapshot`, rendering it only once.
+
+    Same shape as before pre-rendering: tables, summary, version, then
+    wire_trace and pagination when present. `statuses` keeps only tables in
+    those states (pagination counts them only; the summary covers the floor).
+    """
+
+    global _RENDERED
+    statuses = tuple(sorted(set(statuses))) if statuses else None
+    # The ETag names the version and, with the trace included, the trace too
+    key = (
+        snapshot.etag_for(include_wire_trace),
+        page,
+        page_size,
+        statuses,
+        include_wire_trace,
+    )
+    body = _RENDERED.get(key)
+    if body is not None:
+        return body
+
+    positions = snapshot.columns.positions(statuses)
+    pagination = pagination_meta(len(positions), page, page_size)
+    if pagination is not None:
+        positions = positions[max(0, pagination["start_index"] - 1) : pagination["end_index"]]
+    if statuses is None and pagination is None:
+        fragments = snapshot.table_json
+    else:
+        fragments = [snapshot.table_json[position] for position in positions.tolist()]
+
+    parts = [
+        b'{"tables":[',
+        b",".join(fragments),
+        b'],"summary":',
+        snapshot.summary_json,
+        b',"version":%d' % snapshot.version,
+    ]
+    if include_wire_trace and snapshot.wire_trace is not None:
+        parts += [b',"wire_trace":', _dump_json(snapshot.wire_trace)]
+    if pagination is not None:
+        parts += [b',"pagination":', _dump_json(pagination)]
+    parts.append(b"}")
+    body = b"".join(parts)
+
+    # Copy-on-write like the snapshots: concurrent readers never see a
+    # half-updated cache
+    rendered = dict(_RENDERED)
+    while len(rendered) >= RENDER_CACHE_SIZE:
+        rendered.pop(next(iter(rendered)))
+    rendered[key] = body
+    _RENDERED = rendered
+    return body
 
 
 async def get_tables_response(
@@ -140,26 +407,71 @@ async def get_tables_response(
     page: Optional[int],
     page_size: Optional[int],
     include_wire_trace: bool = False,
-) -> Dict[str, Any]:
+    version: Optional[int] = None,
+    statuses: Optional[Sequence[int]] = None,
+    if_none_match: Optional[str] = None,
+) -> Response:
     """
-    Compose the full response payload used by both /tables endpoints.
+    Build the response used by both /tables endpoints from pre-rendered JSON.
+
+    `version` pins the read to an earlier snapshot, so every page of a
+    listing comes from the same table list; `statuses` filters it. The
+    snapshot ETag (the trace variant when the trace is included) is sent
+    along, and a matching `if_none_match` raises NotModifiedError.
     """
 
-    snapshot = await get_tables_snapshot(client)
-    tables_slice, pagination = paginate_tables(snapshot.tables, page, page_size)
+    if version is not None:
+        snapshot = get_pinned_tables_snapshot(version)
+    else:
+        snapshot = await get_tables_snapshot(
+            client, require_wire_trace=include_wire_trace
+        )
+    validate_pagination(page, page_size)
+    etag = snapshot.etag_for(include_wire_trace)
+    _check_not_modified(etag, if_none_match)
+    body = render_tables_body(snapshot, page, page_size, include_wire_trace, statuses)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
-    payload: Dict[str, Any] = {
-        "tables": tables_slice,
-        "summary": summarize_tables(snapshot.tables),
-    }
 
-    if include_wire_trace and snapshot.wire_trace is not None:
-        payload["wire_trace"] = snapshot.wire_trace
+async def get_table_statuses_response(
+    client: "RestaurantClient",
+    table_ids: Sequence[int],
+    *,
+    version: Optional[int] = None,
+    if_none_match: Optional[str] = None,
+) -> Response:
+    """
+    Report the status of a few tables from the snapshot index.
 
-    if pagination:
-        payload["pagination"] = pagination
+    IDs missing from the snapshot are listed under `missing`.
+    """
 
-    return payload
+    if version is not None:
+        snapshot = get_pinned_tables_snapshot(version)
+    else:
+        snapshot = await get_tables_snapshot(client)
+    _check_not_modified(snapshot.etag, if_none_match)
+
+    columns = snapshot.columns
+    table_ids = list(dict.fromkeys(table_ids))
+    tables: List[Table] = []
+    missing: List[int] = []
+    for table_id, position in zip(table_ids, columns.positions_of(table_ids).tolist()):
+        if position < 0:
+            missing.append(table_id)
+            continue
+        tables.append(columns.table(position))
+    return Response(
+        content=_dump_json(
+            {"tables": tables, "missing": missing, "version": snapshot.version}
+        ),
+        media_type="application/json",
+        headers={"ETag": snapshot.etag, "Cache-Control": "no-cache"},
+    )
 
 
 async def _refresh_table_detail_snapshot(
@@ -183,18 +495,50 @@ async def _refresh_table_detail_snapshot(
         wire_trace=wire_trace,
         fetched_at=time.time(),
     )
-    _TABLE_DETAILS[table_id] = snapshot
+    _store_table_detail(snapshot)
     return snapshot
 
 
+def get_fresh_table_content(
+    table_id: int, max_age: float
+) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached table content when it was fetched within `max_age` seconds.
+    """
+
+    snapshot = _TABLE_DETAILS.get(table_id)
+    if snapshot is None or max_age <= 0:
+        return None
+    if time.time() - snapshot.fetched_at > max_age:
+        return None
+    return snapshot.table
+
+
+def store_table_content(table_id: int, table: Dict[str, Any]) -> None:
+    """Cache table content fetched outside the detail endpoints (no wire trace)."""
+
+    _store_table_detail(
+        TableDetailSnapshot(
+            table_id=table_id,
+            table=table,
+            wire_trace=None,
+            fetched_at=time.time(),
+        )
+    )
+
+
 async def get_table_detail_response(
     client: "RestaurantClient",
     table_id: int,
     *,
     include_wire_trace: bool,
+    response: Optional[Response] = None,
+    if_none_match: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Return the cached table detail payload (table + optional trace).
+
+    ETag handling through `response`/`if_none_match` as for the table list.
     """
 
     snapshot = _TABLE_DETAILS.get(table_id)
@@ -203,10 +547,17 @@ async def get_table_detail_response(
     )
 
     if snapshot is None or needs_wire_trace:
-        snapshot = await _refresh_table_detail_snapshot(
-            client, table_id, include_wire_trace=include_wire_trace
-        )
-
+        try:
+            snapshot = await _refresh_table_detail_snapshot(
+                client, table_id, include_wire_trace=include_wire_trace
+            )
+        except (PosUnavailableError, DeadlineExceededError) as exc:
+            if snapshot is None:
+                raise
+            # PoS down or out of time: serve the cached content without the trace
+            logger.warning(f"{exc.detail} Serving cached table {table_id}.")
+
+    _apply_etag(response, snapshot.etag_for(include_wire_trace), if_none_match)
     payload: Dict[str, Any] = {"table": snapshot.table}
     if include_wire_trace and snapshot.wire_trace is not None:
         payload["wire_trace"] = snapshot.wire_trace
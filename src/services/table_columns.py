@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.models.entity_models import Table
+
+# Summary card name per MobileBoardStatus status
+STATUS_LABELS: Dict[int, str] = {1: "open", 2: "closing", 0: "free"}
+
+
+def _frozen(values: Any, dtype: Any) -> np.ndarray:
+    array = np.asarray(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True, eq=False)
+class TableColumns:
+    """
+    Columnar copy of a tables snapshot, built once per snapshot version.
+
+    One read-only NumPy array per numeric/flag field and interned names, so
+    summaries, status filters and snapshot-to-snapshot diffs are vectorized;
+    `Table` models are only materialized at the API boundary (`table()`, for
+    per-table lookups; list bodies come from the pre-rendered JSON).
+    Positions refer to the snapshot's table order, so filtered reads keep the
+    order of the full list.
+    """
+
+    ids: np.ndarray
+    statuses: np.ndarray
+    initial_users: np.ndarray
+    inactive: np.ndarray
+    free_table: np.ndarray
+    names: Tuple[str, ...]
+    lock_descriptions: Tuple[Optional[str], ...]
+    id_order: np.ndarray  # Positions sorted by table ID, for ID lookups
+    sorted_ids: np.ndarray  # ids[id_order]
+
+    @classmethod
+    def from_tables(cls, tables: Sequence[Table]) -> "TableColumns":
+        ids = _frozen([table.id for table in tables], np.int64)
+        id_order = _frozen(np.argsort(ids, kind="stable"), np.intp)
+        return cls(
+            ids=ids,
+            statuses=_frozen([table.status for table in tables], np.int16),
+            initial_users=_frozen([table.initialUser for table in tables], np.int32),
+            inactive=_frozen([table.inactive for table in tables], np.bool_),
+            free_table=_frozen([table.freeTable for table in tables], np.bool_),
+            names=tuple(sys.intern(table.name) for table in tables),
+            lock_descriptions=tuple(table.lockDescription for table in tables),
+            id_order=id_order,
+            sorted_ids=_frozen(ids[id_order], np.int64),
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def table(self, position: int) -> Table:
+        """Materialize the `Table` model at `position`."""
+        return Table(
+            id=int(self.ids[position]),
+            name=self.names[position],
+            status=int(self.statuses[position]),
+            lockDescription=self.lock_descriptions[position],
+            inactive=bool(self.inactive[position]),
+            freeTable=bool(self.free_table[position]),
+            initialUser=int(self.initial_users[position]),
+        )
+
+    def summary(self) -> Dict[str, int]:
+        """Counts for the UI summary cards, plus tables flagged inactive."""
+        known = self.statuses[self.statuses >= 0]
+        counts = np.bincount(known, minlength=max(STATUS_LABELS) + 1)
+        summary = {"total": self.size}
+        for status, label in STATUS_LABELS.items():
+            summary[label] = int(counts[status])
+        summary["inactive"] = int(np.count_nonzero(self.inactive))
+        return summary
+
+    def positions(self, statuses: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Positions of the tables in any of `statuses` (all tables when None)."""
+        if statuses is None:
+            return np.arange(self.size)
+        return np.flatnonzero(np.isin(self.statuses, list(statuses)))
+
+    def positions_of(self, table_ids: Sequence[int]) -> np.ndarray:
+        """Position of each ID in `table_ids`, -1 where the snapshot lacks it."""
+        wanted = np.asarray(table_ids, dtype=np.int64)
+        if not self.size:
+            return np.full(len(wanted), -1, dtype=np.intp)
+        slots = np.searchsorted(self.sorted_ids, wanted)
+        slots = np.minimum(slots, self.size - 1)
+        found = self.sorted_ids[slots] == wanted
+        return np.where(found, self.id_order[slots], -1)
+
+    def position_of(self, table_id: int) -> Optional[int]:
+        position = int(self.positions_of([table_id])[0])
+        return position if position >= 0 else None
+
+    def diff(self, previous: "TableColumns") -> List[Dict[str, Any]]:
+        """
+        Status transitions from `previous` to this snapshot, in table order.
+
+        Tables that appeared or disappeared between the two are not reported.
+        """
+        if not previous.size:
+            return []
+        before = previous.positions_of(self.ids)
+        known = before >= 0
+        old_statuses = np.where(known, previous.statuses[np.maximum(before, 0)], 0)
+        changed = np.flatnonzero(known & (old_statuses != self.statuses))
+        return [
+            {
+                "table_id": int(self.ids[position]),
+                "name": self.names[position],
+                "from": int(old_statuses[position]),
+                "to": int(self.statuses[position]),
+            }
+            for position in changed
+        ]
@@ -0,0 +1,164 @@
+"""Push table status transitions to the backend as webhook events."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from src.services.table_cache import publish_tables_snapshot
+from src.services.table_columns import TableColumns
+from src.services.webhooks import WebhookDispatcher
+from src.utils.deadline import deadline_scope
+from src.utils.settings import get_settings
+
+if TYPE_CHECKING:  # pragma: no cover - import used for typing only
+    from src.clients.restaurant_client import RestaurantClient
+
+logger = logging.getLogger(__name__)
+
+STATUS_CHANGED = "table.status_changed"
+
+
+def merge_status_events(
+    pending: Dict[str, Any], latest: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Fold a new transition into the one still waiting for delivery.
+
+    1 -> 2 then 2 -> 0 becomes 1 -> 0; a flip back (1 -> 2 -> 1) cancels out.
+    """
+    if latest["to"] == pending["from"]:
+        return None
+    return {**latest, "from": pending["from"]}
+
+
+class TableStatusWatcher:
+    """
+    Poll the MobileBoardStatus list and report status changes.
+
+    Each poll is diffed against the previous one; every transition becomes a
+    `table.status_changed` event for each `table_events_webhook_urls` entry,
+    handed to the WebhookDispatcher with the table as coalescing key, so
+    rapid flips not yet sent collapse into one event (or none). The first
+    poll only sets the baseline. Each poll also refreshes the /tables
+    snapshot. Polls run at panel priority and back off while the PoS fails.
+    """
+
+    MAX_BACKOFF: float = 30.0
+
+    _instance: Optional["TableStatusWatcher"] = None
+    _singleton_lock = threading.Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(TableStatusWatcher, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.urls = settings.table_events_webhook_urls
+            self.interval: float = settings.table_watch_interval
+            self.poll_timeout: float = settings.request_timeout_default
+            self._columns: Optional[TableColumns] = None
+            self.last_poll_at: Optional[float] = None
+            self.last_error: Optional[str] = None
+            self.events_emitted = 0
+            self._client: Optional["RestaurantClient"] = None
+            self._client_factory: Optional[Callable[[], "RestaurantClient"]] = None
+            self._worker: Optional[asyncio.Task] = None
+            self._initialized = True  # Prevent re-initialization
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls)
+
+    def start(self, client_factory: Callable[[], "RestaurantClient"]):
+        """Start polling; a no-op when no webhook URL is configured."""
+        if not self.enabled:
+            return
+        if self._worker is not None and not self._worker.done():
+            return
+        self._client_factory = client_factory
+        self._worker = asyncio.get_running_loop().create_task(self._watch_loop())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _watch_loop(self):
+        delay = self.interval
+        while True:
+            started_at = time.monotonic()
+            try:
+                await self.poll()
+                self.last_error = None
+                delay = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                self.last_error = f"{type(e).__name__}: {detail}"
+                delay = min(self.MAX_BACKOFF, delay * 2)
+                logger.warning(f"Table status poll failed ({self.last_error}), next in {delay:.0f}s.")
+            await asyncio.sleep(max(0.0, delay - (time.monotonic() - started_at)))
+
+    async def _get_client(self) -> "RestaurantClient":
+        if self._client is None:
+            # The real client loads its product cache with asyncio.run in __init__
+            self._client = await asyncio.to_thread(self._client_factory)
+        return self._client
+
+    async def poll(self) -> int:
+        """Fetch the table list once and emit its transitions; returns how many."""
+        client = await self._get_client()
+        with deadline_scope(self.poll_timeout):
+            tables = await client.fetch_tables()
+        self.last_poll_at = time.time()
+        columns = publish_tables_snapshot(tables).columns
+
+        previous = self._columns
+        self._columns = columns
+        if previous is None or previous is columns:
+            return 0
+
+        changes = [
+            {"type": STATUS_CHANGED, **change, "changed_at": self.last_poll_at}
+            for change in columns.diff(previous)
+        ]
+        dispatcher = WebhookDispatcher()
+        for event in changes:
+            for url in self.urls:
+                await dispatcher.enqueue(
+                    url,
+                    event,
+                    coalesce_key=f"table:{event['table_id']}",
+                    merge=merge_status_events,
+                )
+        self.events_emitted += len(changes)
+        if changes:
+            logger.info(f"{len(changes)} table status change(s) queued for webhooks.")
+        return len(changes)
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the watcher for diagnostics."""
+        return {
+            "enabled": self.enabled,
+            "running": self._worker is not None and not self._worker.done(),
+            "interval": self.interval,
+            "tables": self._columns.size if self._columns is not None else 0,
+            "last_poll_at": self.last_poll_at,
+            "last_error": self.last_error,
+            "events_emitted": self.events_emitted,
+        }
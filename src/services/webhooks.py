@@ -0,0 +1,374 @@
+"""Batched, persistent webhook delivery to the Astra backend."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from src.utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    ref TEXT,
+    coalesce_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS webhook_events_status ON webhook_events (status, url, id);
+CREATE INDEX IF NOT EXISTS webhook_events_ref ON webhook_events (ref);
+CREATE INDEX IF NOT EXISTS webhook_events_coalesce ON webhook_events (url, coalesce_key, status);
+"""
+
+_COLUMNS = (
+    "id, url, ref, coalesce_key, payload, status, attempts, next_attempt_at, last_error, "
+    "created_at, updated_at"
+)
+
+
+def create_schema(connection: sqlite3.Connection) -> None:
+    """Create the webhook_events table and its indexes if missing."""
+    connection.executescript(_SCHEMA)
+
+
+def insert_event(
+    connection: sqlite3.Connection,
+    url: str,
+    event: Dict[str, Any],
+    ref: Optional[str] = None,
+    coalesce_key: Optional[str] = None,
+    now: Optional[float] = None,
+):
+    """
+    Add a pending event through `connection`, inside the caller's transaction.
+
+    Lets another store sharing the database (the outbox) commit an event
+    together with the change that caused it; call `WebhookDispatcher.wake()`
+    once committed.
+    """
+    now = time.time() if now is None else now
+    connection.execute(
+        "INSERT INTO webhook_events (url, ref, coalesce_key, payload, status, "
+        "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (url, ref, coalesce_key, json.dumps(event), PENDING, now, now, now),
+    )
+
+
+class WebhookDispatcher:
+    """
+    Deliver events to webhook URLs, several per request, until acknowledged.
+
+    Events are stored in SQLite (next to the outbox) before delivery, so they
+    survive restarts. The worker waits `webhook_batch_delay` after the first
+    event to gather others, then POSTs up to `webhook_batch_size` events per
+    URL as `{"events": [...]}`. A 2xx answer acknowledges the whole batch; any
+    other outcome retries it with exponential backoff, until
+    `webhook_max_attempts`. With `webhook_secret` set, each body is signed in
+    the `X-Signature: sha256=<hex>` header.
+
+    Events sharing a `coalesce_key` are merged while still pending, and at most
+    `webhook_queue_max` of them wait at any time: past that the oldest are
+    dropped, so a long outage of the receiver cannot fill the disk. Events
+    without a key (job callbacks) are never dropped; the outbox bounds them.
+    """
+
+    POLL_INTERVAL: float = 1.0
+    RETRY_JITTER: float = 0.2
+    REQUEST_TIMEOUT: float = 10.0
+
+    _instance: Optional["WebhookDispatcher"] = None
+    _singleton_lock = threading.Lock()  # For thread-safe singleton implementation
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._singleton_lock:
+                if not cls._instance:
+                    cls._instance = super(WebhookDispatcher, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "_initialized"):
+            settings = get_settings()
+            self.batch_size: int = settings.webhook_batch_size
+            self.batch_delay: float = settings.webhook_batch_delay
+            self.max_attempts: int = settings.webhook_max_attempts
+            self.retry_backoff: float = settings.webhook_retry_backoff
+            self.retry_max_backoff: float = settings.webhook_retry_max_backoff
+            self.secret: Optional[str] = settings.webhook_secret
+            self.queue_max: int = settings.webhook_queue_max
+            self.retention: float = settings.outbox_retention
+            self.dropped = 0
+            self._db_lock = threading.Lock()
+            self._connection = sqlite3.connect(
+                settings.outbox_path, check_same_thread=False, isolation_level=None
+            )
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            create_schema(self._connection)
+            self._in_flight: set = set()  # Event IDs being POSTed, under _db_lock
+            self._http: Optional[httpx.AsyncClient] = None
+            self._wakeup: Optional[asyncio.Event] = None
+            self._worker: Optional[asyncio.Task] = None
+            self._initialized = True  # Prevent re-initialization
+
+    def _execute(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            cursor = self._connection.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    async def _run(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._execute, query, params)
+
+    async def enqueue(
+        self,
+        url: str,
+        event: Dict[str, Any],
+        ref: Optional[str] = None,
+        coalesce_key: Optional[str] = None,
+        merge: Optional[
+            Callable[[Dict[str, Any], Dict[str, Any]], Optional[Dict[str, Any]]]
+        ] = None,
+    ):
+        """
+        Persist an event for `url`; `ref` ties it to its source (e.g. "job:12").
+
+        With a `coalesce_key`, a pending event of the same URL and key (not
+        being sent right now) is replaced instead: by `merge(old, new)` when
+        given (None drops both), else by `event`. The merged event keeps the
+        old one's queue position.
+        """
+        await asyncio.to_thread(
+            self._store, url, event, ref, coalesce_key, merge, time.time()
+        )
+        self.wake()
+
+    def wake(self):
+        """Have the worker look for due events now."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _store(self, url, event, ref, coalesce_key, merge, now: float):
+        with self._db_lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            if coalesce_key is not None:
+                row = self._connection.execute(
+                    "SELECT id, payload FROM webhook_events WHERE url = ? AND "
+                    "coalesce_key = ? AND status = ? ORDER BY id DESC LIMIT 1",
+                    (url, coalesce_key, PENDING),
+                ).fetchone()
+                if row is not None and row["id"] not in self._in_flight:
+                    if merge is not None:
+                        event = merge(json.loads(row["payload"]), event)
+                    if event is None:
+                        self._connection.execute(
+                            "DELETE FROM webhook_events WHERE id = ?", (row["id"],)
+                        )
+                    else:
+                        self._connection.execute(
+                            "UPDATE webhook_events SET payload = ?, ref = ?, "
+                            "updated_at = ? WHERE id = ?",
+                            (json.dumps(event), ref, now, row["id"]),
+                        )
+                    return
+
+            insert_event(self._connection, url, event, ref, coalesce_key, now)
+            if coalesce_key is None:
+                return
+            # Only coalescable events are superseded by later ones; drop those
+            dropped = self._connection.execute(
+                "DELETE FROM webhook_events WHERE status = ? AND coalesce_key IS NOT NULL "
+                "AND id NOT IN (SELECT id FROM webhook_events WHERE status = ? AND "
+                "coalesce_key IS NOT NULL ORDER BY id DESC LIMIT ?)",
+                (PENDING, PENDING, self.queue_max),
+            ).rowcount
+        if dropped:
+            self.dropped += dropped
+            logger.warning(
+                f"Webhook queue full ({self.queue_max}), dropped {dropped} oldest event(s)."
+            )
+
+    async def delivery_status(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Latest delivery state of the events tied to `ref`."""
+        rows = await self._run(
+            "SELECT url, status, attempts, last_error, updated_at FROM webhook_events "
+            "WHERE ref = ? ORDER BY id DESC LIMIT 1",
+            (ref,),
+        )
+        return rows[0] if rows else None
+
+    def start(self):
+        """Start the delivery worker; undelivered events from a previous run go first."""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._http = httpx.AsyncClient(timeout=self.REQUEST_TIMEOUT)
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._deliver_loop())
+
+    async def stop(self):
+        """Stop the worker; undelivered events stay on disk."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _deliver_loop(self):
+        last_prune = 0.0
+        while True:
+            try:
+                next_due = await self.deliver_due()
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    await self._run(
+                        "DELETE FROM webhook_events WHERE status = ? AND updated_at < ?",
+                        (DELIVERED, time.time() - self.retention),
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook delivery failed: {e}", exc_info=True)
+                next_due = None
+
+            timeout = self.POLL_INTERVAL
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                # Give events arriving right after this one a chance to share the batch
+                await asyncio.sleep(self.batch_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def deliver_due(self) -> Optional[float]:
+        """POST one batch per URL with due events; returns when the next is due."""
+        batches, next_due = await asyncio.to_thread(self._claim_due, time.time())
+        try:
+            await asyncio.gather(
+                *(self._post(url, batch) for url, batch in batches.items())
+            )
+        finally:
+            with self._db_lock:
+                self._in_flight.clear()
+        return next_due
+
+    def _claim_due(self, now: float):
+        """Pick this round's batches and shield them from coalescing while sent."""
+        with self._db_lock:
+            pending = [
+                dict(row)
+                for row in self._connection.execute(
+                    f"SELECT {_COLUMNS} FROM webhook_events WHERE status = ? ORDER BY id",
+                    (PENDING,),
+                )
+            ]
+            batches: Dict[str, List[Dict[str, Any]]] = {}
+            next_due: List[float] = []
+            waiting: set = set()
+            for event in pending:
+                if event["url"] in waiting:
+                    continue
+                if event["next_attempt_at"] > now:
+                    # Keep a URL's events in order: later ones wait for this retry
+                    waiting.add(event["url"])
+                    next_due.append(event["next_attempt_at"])
+                    continue
+                batch = batches.setdefault(event["url"], [])
+                if len(batch) < self.batch_size:
+                    batch.append(event)
+                    self._in_flight.add(event["id"])
+                else:
+                    next_due.append(now)  # More to send right after this round
+        return batches, (min(next_due) if next_due else None)
+
+    async def _post(self, url: str, batch: List[Dict[str, Any]]):
+        body = json.dumps(
+            {"events": [json.loads(event["payload"]) for event in batch]}
+        ).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            signature = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Signature"] = f"sha256={signature}"
+
+        error: Optional[str] = None
+        try:
+            response = await self._http.post(url, content=body, headers=headers)
+            if not response.is_success:
+                error = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+
+        ids = [event["id"] for event in batch]
+        placeholders = ",".join("?" for _ in ids)
+        now = time.time()
+        if error is None:
+            await self._run(
+                f"UPDATE webhook_events SET status = ?, attempts = attempts + 1, "
+                f"last_error = NULL, updated_at = ? WHERE id IN ({placeholders})",
+                (DELIVERED, now, *ids),
+            )
+            logger.info(f"Delivered {len(batch)} webhook event(s) to {url}.")
+            return
+
+        attempts = max(event["attempts"] for event in batch) + 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Giving up on {len(batch)} webhook event(s) to {url}: {error}")
+            await self._run(
+                f"UPDATE webhook_events SET status = ?, attempts = ?, last_error = ?, "
+                f"updated_at = ? WHERE id IN ({placeholders})",
+                (FAILED, attempts, error, now, *ids),
+            )
+            return
+        backoff = min(self.retry_max_backoff, self.retry_backoff * 2 ** (attempts - 1))
+        retry_at = now + backoff * (1 + random.uniform(0, self.RETRY_JITTER))
+        logger.warning(
+            f"Webhook delivery to {url} failed ({error}); retrying in {retry_at - now:.1f}s."
+        )
+        await self._run(
+            f"UPDATE webhook_events SET attempts = ?, last_error = ?, next_attempt_at = ?, "
+            f"updated_at = ? WHERE id IN ({placeholders})",
+            (attempts, error, retry_at, now, *ids),
+        )
+
+    async def status(self) -> Dict[str, Any]:
+        """Events per status, for diagnostics."""
+        rows = await self._run(
+            "SELECT status, COUNT(*) AS count FROM webhook_events GROUP BY status"
+        )
+        counts = {PENDING: 0, DELIVERED: 0, FAILED: 0}
+        for row in rows:
+            counts[row["status"]] = row["count"]
+        return {
+            "worker_running": self._worker is not None and not self._worker.done(),
+            "counts": counts,
+            "queue_max": self.queue_max,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,94 @@
+"""Per-request deadline shared by every layer that talks to the PoS."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+from src.errors.deadline_exceeded_error import DeadlineExceededError
+
+T = TypeVar("T")
+
+# Absolute deadline on the time.monotonic() clock; None means "no deadline"
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(timeout: Optional[float]) -> Token:
+    """Start a deadline `timeout` seconds from now (None clears it)."""
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    return _DEADLINE.set(deadline)
+
+
+def reset_deadline(token: Token) -> None:
+    """Restore the deadline that was active before `set_deadline`."""
+
+    _DEADLINE.reset(token)
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[None]:
+    """Run a block under its own deadline, never extending an outer one."""
+
+    outer = remaining()
+    if outer is not None and (timeout is None or outer < timeout):
+        timeout = outer
+    token = set_deadline(timeout)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without a deadline."""
+
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Shrink `timeout` so it never outlives the current deadline."""
+
+    left = remaining()
+    if left is None:
+        return timeout
+    if timeout is None:
+        return left
+    return min(timeout, left)
+
+
+def check_deadline(operation: str = "request") -> None:
+    """Raise a 504 when the current deadline has already passed."""
+
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceededError(f"Deadline exceeded before {operation}.")
+
+
+async def within_deadline(awaitable: Awaitable[T], operation: str = "request") -> T:
+    """
+    Await `awaitable`, cancelling it when the current deadline expires.
+
+    Cancellation runs the awaited code's `finally` blocks, so sockets opened
+    inside are closed before the 504 is raised.
+    """
+
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        # Close the coroutine so it does not warn about never being awaited
+        close = getattr(awaitable, "close", None)
+        if close is not None:
+            close()
+        raise DeadlineExceededError(f"Deadline exceeded before {operation}.")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=left)
+    except asyncio.TimeoutError as exc:
+        raise DeadlineExceededError(f"Deadline exceeded during {operation}.") from exc
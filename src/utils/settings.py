@@ -24,6 +24,49 @@ class Settings:
     coti_cloud_services_url: str
     language: str
     frontend_allowed_origins: tuple[str, ...]
+    batch_max_concurrency: int
+    prebill_board_max_age: float
+    token_refresh_margin: float
+    token_refresh_jitter: float
+    credential_cache_ttl: float
+    pos_host: str
+    pos_port: int
+    pos_fallback_hosts: tuple[str, ...]
+    pos_discovery_subnet: Optional[str]
+    pos_discovery_failure_threshold: int
+    pos_breaker_failure_rate: float
+    pos_breaker_minimum_calls: int
+    pos_breaker_open_seconds: float
+    pos_connect_timeout: float
+    pos_read_timeout: float
+    pos_read_timeout_min: float
+    pos_read_timeout_max: float
+    pos_list_seconds_per_1000_rows: float
+    request_timeout_default: float
+    request_timeout_max: float
+    pos_max_concurrency: int
+    pos_payment_reserved_slots: int
+    pos_adaptive_concurrency: bool
+    pos_concurrency_min: int
+    pos_concurrency_max: int
+    idempotency_ttl: float
+    outbox_path: str
+    outbox_max_attempts: int
+    outbox_retry_backoff: float
+    outbox_retry_max_backoff: float
+    outbox_retention: float
+    webhook_batch_size: int
+    webhook_batch_delay: float
+    webhook_max_attempts: int
+    webhook_retry_backoff: float
+    webhook_retry_max_backoff: float
+    webhook_secret: Optional[str]
+    webhook_queue_max: int
+    job_callback_hosts: tuple[str, ...]
+    table_events_webhook_urls: tuple[str, ...]
+    table_watch_interval: float
+    tables_snapshot_history: int
+    tables_snapshot_max_age: float
 
 
 def _normalize_string(raw_value: Optional[str], default: str = "") -> str:
@@ -46,6 +89,13 @@ def _parse_origins(raw_value: Optional[str]) -> tuple[str, ...]:
     return origins or ("http://localhost:3000",)
 
 
+def _parse_list(raw_value: Optional[str]) -> tuple[str, ...]:
+    """Split a comma-separated value, dropping empty entries."""
+    if not raw_value:
+        return ()
+    return tuple(item.strip() for item in raw_value.split(",") if item.strip())
+
+
 @lru_cache(maxsize=1)
 def get_settings(config_path: Path = DEFAULT_CONFIG_PATH) -> Settings:
     """
@@ -76,6 +126,112 @@ def get_settings(config_path: Path = DEFAULT_CONFIG_PATH) -> Settings:
         frontend_allowed_origins=_parse_origins(
             section.get("frontend_allowed_origins")
         ),
+        batch_max_concurrency=max(
+            1, section.getint("batch_max_concurrency", fallback=4)
+        ),
+        prebill_board_max_age=max(
+            0.0, section.getfloat("prebill_board_max_age", fallback=30.0)
+        ),
+        token_refresh_margin=max(
+            0.0, section.getfloat("token_refresh_margin", fallback=300.0)
+        ),
+        token_refresh_jitter=max(
+            0.0, section.getfloat("token_refresh_jitter", fallback=30.0)
+        ),
+        credential_cache_ttl=max(
+            0.0, section.getfloat("credential_cache_ttl", fallback=43200.0)
+        ),
+        pos_host=_normalize_string(section.get("pos_host"), "192.168.15.100"),
+        pos_port=section.getint("pos_port", fallback=8978),
+        pos_fallback_hosts=_parse_list(section.get("pos_fallback_hosts")),
+        pos_discovery_subnet=_normalize_string(section.get("pos_discovery_subnet"))
+        or None,
+        pos_discovery_failure_threshold=max(
+            1, section.getint("pos_discovery_failure_threshold", fallback=3)
+        ),
+        pos_breaker_failure_rate=min(
+            1.0, max(0.0, section.getfloat("pos_breaker_failure_rate", fallback=0.5))
+        ),
+        pos_breaker_minimum_calls=max(
+            1, section.getint("pos_breaker_minimum_calls", fallback=4)
+        ),
+        pos_breaker_open_seconds=max(
+            1.0, section.getfloat("pos_breaker_open_seconds", fallback=15.0)
+        ),
+        pos_connect_timeout=max(
+            0.1, section.getfloat("pos_connect_timeout", fallback=5.0)
+        ),
+        pos_read_timeout=max(0.1, section.getfloat("pos_read_timeout", fallback=5.0)),
+        pos_read_timeout_min=max(
+            0.1, section.getfloat("pos_read_timeout_min", fallback=1.0)
+        ),
+        pos_read_timeout_max=max(
+            0.1, section.getfloat("pos_read_timeout_max", fallback=30.0)
+        ),
+        pos_list_seconds_per_1000_rows=max(
+            0.0, section.getfloat("pos_list_seconds_per_1000_rows", fallback=2.0)
+        ),
+        request_timeout_default=max(
+            0.0, section.getfloat("request_timeout_default", fallback=10.0)
+        ),
+        request_timeout_max=max(
+            0.0, section.getfloat("request_timeout_max", fallback=60.0)
+        ),
+        pos_max_concurrency=max(1, section.getint("pos_max_concurrency", fallback=4)),
+        pos_payment_reserved_slots=max(
+            0, section.getint("pos_payment_reserved_slots", fallback=1)
+        ),
+        pos_adaptive_concurrency=section.getboolean(
+            "pos_adaptive_concurrency", fallback=True
+        ),
+        pos_concurrency_min=max(1, section.getint("pos_concurrency_min", fallback=1)),
+        pos_concurrency_max=max(1, section.getint("pos_concurrency_max", fallback=16)),
+        idempotency_ttl=max(
+            60.0, section.getfloat("idempotency_ttl", fallback=86400.0)
+        ),
+        outbox_path=_normalize_string(section.get("outbox_path"), "pos_outbox.db"),
+        outbox_max_attempts=max(1, section.getint("outbox_max_attempts", fallback=20)),
+        outbox_retry_backoff=max(
+            0.1, section.getfloat("outbox_retry_backoff", fallback=2.0)
+        ),
+        outbox_retry_max_backoff=max(
+            1.0, section.getfloat("outbox_retry_max_backoff", fallback=300.0)
+        ),
+        outbox_retention=max(
+            0.0, section.getfloat("outbox_retention", fallback=604800.0)
+        ),
+        webhook_batch_size=max(1, section.getint("webhook_batch_size", fallback=20)),
+        webhook_batch_delay=max(
+            0.0, section.getfloat("webhook_batch_delay", fallback=0.2)
+        ),
+        webhook_max_attempts=max(
+            1, section.getint("webhook_max_attempts", fallback=10)
+        ),
+        webhook_retry_backoff=max(
+            0.1, section.getfloat("webhook_retry_backoff", fallback=2.0)
+        ),
+        webhook_retry_max_backoff=max(
+            1.0, section.getfloat("webhook_retry_max_backoff", fallback=300.0)
+        ),
+        webhook_secret=_normalize_string(section.get("webhook_secret")) or None,
+        webhook_queue_max=max(
+            100, section.getint("webhook_queue_max", fallback=10000)
+        ),
+        job_callback_hosts=tuple(
+            host.lower() for host in _parse_list(section.get("job_callback_hosts"))
+        ),
+        table_events_webhook_urls=_parse_list(
+            section.get("table_events_webhook_urls")
+        ),
+        table_watch_interval=max(
+            0.2, section.getfloat("table_watch_interval", fallback=1.0)
+        ),
+        tables_snapshot_history=max(
+            1, section.getint("tables_snapshot_history", fallback=8)
+        ),
+        tables_snapshot_max_age=max(
+            0.0, section.getfloat("tables_snapshot_max_age", fallback=0.0)
+        ),
     )
 
 